@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+import os
+import selectors
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import myx
+
+# Stands in for docker.DockerClient when no daemon is present: "containers" are
+# temp directories and exec runs the command locally, streamed like exec_start.
+
+class FakeContainer:
+    def __init__(self, client, image):
+        self.client = client
+        self.id = f"fake-{next(client.ids)}"
+        self.image = image
+        self.workdir = tempfile.mkdtemp(prefix="fakecontainer_")
+
+    def remove(self, force=False):
+        self.client.removed += 1
+        subprocess.run(["rm", "-rf", self.workdir])
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+
+    def run(self, image, command, detach=False, **kwargs):
+        self.client.started += 1
+        container = FakeContainer(self.client, image)
+        self.client.containers_by_id[container.id] = container
+        return container
+
+class FakeAPI:
+    def __init__(self, client):
+        self.client = client
+        self.execs = {}
+
+    def exec_create(self, container_id, cmd, workdir=None):
+        exec_id = f"exec-{next(self.client.ids)}"
+        self.execs[exec_id] = {"cmd": cmd, "cwd": self.client.containers_by_id[container_id].workdir, "exit": None}
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id, stream=False, demux=False):
+        state = self.execs[exec_id]
+        proc = subprocess.Popen(state["cmd"], cwd=state["cwd"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        selector = selectors.DefaultSelector()
+        selector.register(proc.stdout, selectors.EVENT_READ, 0)
+        selector.register(proc.stderr, selectors.EVENT_READ, 1)
+        while selector.get_map():
+            for key, _ in selector.select():
+                chunk = os.read(key.fileobj.fileno(), 65536)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    continue
+                yield (chunk, None) if key.data == 0 else (None, chunk)
+        state["exit"] = proc.wait()
+
+    def exec_inspect(self, exec_id):
+        return {"ExitCode": self.execs[exec_id]["exit"]}
+
+class FakeDockerClient:
+    def __init__(self):
+        self.ids = itertools.count()
+        self.containers_by_id = {}
+        self.started = 0
+        self.removed = 0
+        self.containers = FakeContainers(self)
+        self.api = FakeAPI(self)
+
+CHECKS = [
+    ("2**10", myx.Language.PYTHON, "1024"),
+    ("x = 3\nprint(x)\nx * 2", myx.Language.PYTHON, "3\n6"),
+    ("console.log(6 * 7)", myx.Language.JAVASCRIPT, "42"),
+    ("echo hi", myx.Language.BASH, "hi"),
+]
+
+async def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    client = FakeDockerClient()
+    pool = myx.ContainerPool(client, dict(myx.DOCKER_IMAGES), 2, 1, 5.0, 4096, 256, 64)
+    await asyncio.sleep(0.2)
+    for code, lang, expected in CHECKS:
+        chunks = []
+        result = await pool.run(code, lang, chunks.append)
+        await asyncio.sleep(0)
+        status = "ok" if result.stdout == expected and "".join(chunks).strip() == expected else "FAIL"
+        print(f"{status:<4} {lang:<10} {code!r:<28} -> {result.stdout!r} (rc={result.returncode})")
+    result = await pool.run("print('x' * 100000)", myx.Language.PYTHON)
+    print(f"{'ok' if result.truncated else 'FAIL':<4} truncation: {len(result.stdout)} chars kept")
+    started = perf_counter()
+    for _ in range(runs):
+        await pool.run("1 + 1", myx.Language.PYTHON)
+    elapsed = (perf_counter() - started) / runs
+    print(f"warm run {elapsed * 1000:.1f}ms, started={client.started} removed={client.removed} recycled={pool.recycled}")
+    pool.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+import asyncio
+import sys
+from pathlib import Path
+from time import perf_counter
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import myx
+
+SNIPPETS = [
+    "2**10",
+    "len(str(3**1000))",
+    "msg.from_user.first_name",
+    "[x * x for x in range(10)]",
+    "await asyncio.sleep(0)",
+]
+
+MSG = SimpleNamespace(from_user=SimpleNamespace(first_name="bench"), reply_to_message=None)
+
+def namespace():
+    globs = myx.executor.eval_vars.copy()
+    globs.update(myx.message_vars(MSG))
+    return globs
+
+async def measure(code: str, number: int, cold: bool) -> float:
+    started = perf_counter()
+    for _ in range(number):
+        if cold:
+            myx.code_cache.entries.clear()
+        await myx.myEval(code, namespace())
+    return (perf_counter() - started) / number
+
+async def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{'snippet':<28} {'mode':<5} {'wrapped':>10} {'fast':>10} {'speedup':>8}")
+    for code in SNIPPETS:
+        for cold in (False, True):
+            runs = number // 10 if cold else number
+            # A leading statement forces the AsyncFunctionDef path for the same expression.
+            wrapped = await measure(f"pass\n{code}", runs, cold)
+            fast = await measure(code, runs, cold)
+            mode = "cold" if cold else "warm"
+            print(f"{code:<28} {mode:<5} {wrapped * 1e6:>8.2f}us {fast * 1e6:>8.2f}us {wrapped / fast:>7.1f}x")
+    myx.executor.python_pool.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+import json
+import sys
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import myx
+
+CORPUS = Path(__file__).resolve().parent / "language_corpus.json"
+
+def legacy_detect(code: str) -> str:
+    code = code.strip()
+    py_keywords = ["def ", "import ", "print(", "class ", "async ", "await "]
+    js_keywords = ["console.log", "function ", "var ", "let ", "const ", "=>", "import ", "export "]
+    bash_keywords = ["echo ", "ls", "pwd", "cd ", "cat ", "grep ", "rm "]
+    if any(kw in code for kw in py_keywords):
+        return myx.Language.PYTHON
+    if any(kw in code for kw in js_keywords):
+        return myx.Language.JAVASCRIPT
+    if any(kw in code for kw in bash_keywords):
+        return myx.Language.BASH
+    return myx.Language.PYTHON
+
+def detect(code: str) -> str:
+    return myx.detect_language(code.strip())[0]
+
+def evaluate(name: str, detector, corpus, repeat: int):
+    misses = [entry for entry in corpus if detector(entry["code"]) != entry["language"]]
+    started = perf_counter()
+    for _ in range(repeat):
+        for entry in corpus:
+            detector(entry["code"])
+    per_call = (perf_counter() - started) / (repeat * len(corpus))
+    accuracy = 1 - len(misses) / len(corpus)
+    print(f"{name:<8} accuracy={accuracy:.1%} ({len(corpus) - len(misses)}/{len(corpus)}) latency={per_call * 1e6:.1f}us/call")
+    for entry in misses:
+        print(f"  miss [{entry['language']} -> {detector(entry['code'])}] {entry['code'][:60]!r}")
+
+def main():
+    corpus = json.loads(CORPUS.read_text())
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    evaluate("legacy", legacy_detect, corpus, repeat)
+    evaluate("compiled", detect, corpus, repeat)
+    myx.executor.python_pool.shutdown()
+
+if __name__ == "__main__":
+    main()
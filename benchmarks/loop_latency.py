@@ -0,0 +1,57 @@
+import asyncio
+import statistics
+import sys
+from pathlib import Path
+from time import perf_counter
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import myx
+
+CPU_SNIPPET = "total = 0\nfor i in range(2_000_000):\n    total += i * i\nprint(total)"
+IO_SNIPPET = "await asyncio.sleep(0.05)\nprint('io done')"
+
+async def reply(*args, **kwargs):
+    return None
+
+MSG = SimpleNamespace(from_user=None, reply_to_message=None, reply=reply)
+
+async def probe(lags, stop, interval=0.005):
+    while not stop.is_set():
+        started = perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(perf_counter() - started - interval)
+
+async def run(route_cpu_bound: bool, rounds: int, width: int):
+    myx.executor.config.route_cpu_bound = route_cpu_bound
+    myx.executor.config.cache_results = False
+    lags, stop = [], asyncio.Event()
+    ticker = asyncio.create_task(probe(lags, stop))
+    routes = {}
+    started = perf_counter()
+    for _ in range(rounds):
+        results = await asyncio.gather(*(
+            myx.executor._execute_single(CPU_SNIPPET if i % 2 else IO_SNIPPET, myx.Language.PYTHON, MSG)
+            for i in range(width)
+        ))
+        for result in results:
+            routes[result.route] = routes.get(result.route, 0) + 1
+    elapsed = perf_counter() - started
+    stop.set()
+    await ticker
+    lags.sort()
+    print(
+        f"route_cpu_bound={route_cpu_bound!s:<5} wall={elapsed:.2f}s "
+        f"lag p50={statistics.median(lags) * 1000:.1f}ms p99={lags[int(len(lags) * 0.99)] * 1000:.1f}ms "
+        f"max={lags[-1] * 1000:.1f}ms routes={routes}"
+    )
+
+async def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    await run(False, rounds, width)
+    await run(True, rounds, width)
+    myx.executor.python_pool.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import sys
+import tracemalloc
+from pathlib import Path
+from timeit import timeit
+from typing import Optional
+
+import msgpack
+import pydantic
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import myx
+
+class LegacyExecutionResult(pydantic.BaseModel):
+    stdout: str
+    stderr: str
+    returncode: int
+    language: str
+    execution_time: float
+    success: bool = False
+    truncated: bool = False
+    timed_out: bool = False
+    cpu_time: float = 0.0
+    peak_memory: int = 0
+    profile_report: Optional[str] = None
+    route: str = ""
+
+    @pydantic.field_validator("language")
+    def validate_language(cls, v):
+        if v not in {myx.Language.PYTHON, myx.Language.JAVASCRIPT, myx.Language.SHELL, myx.Language.BASH}:
+            raise ValueError("invalid language")
+        return v
+
+FIELDS = dict(
+    stdout="x" * 2048, stderr="", returncode=0, language=myx.Language.PYTHON, execution_time=0.0123,
+    success=True, cpu_time=0.01, route="worker",
+)
+
+def measure(name: str, hit, number: int):
+    per_hit = timeit(hit, number=number) / number
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [hit() for _ in range(1000)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats) / len(kept)
+    size = sum(stat.size_diff for stat in stats) / len(kept)
+    print(f"{name:<8} {per_hit * 1e6:>8.2f}us/hit {blocks:>6.1f} blocks/hit {size:>8.0f} bytes/hit")
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    legacy_bytes = msgpack.packb(LegacyExecutionResult(**FIELDS).model_dump())
+    raw = myx.ExecutionResult(**FIELDS).to_bytes()
+    measure("legacy", lambda: LegacyExecutionResult(**msgpack.unpackb(legacy_bytes)), number)
+    measure("raw", lambda: myx.ExecutionResult.from_bytes(raw), number)
+    measure("raw+read", lambda: myx.ExecutionResult.from_bytes(raw).stdout, number)
+    myx.executor.python_pool.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+from timeit import timeit
+
+import bleach
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import myx
+
+SNIPPETS = {
+    "plain": "for i in range(10):\n    print(i)\n",
+    "comparison": "print([x for x in range(100) if x < 50 and x > 10])\n",
+    "nbsp": "for i in range(3):\n" + "\u00a0" * 4 + "print(i)\n",
+    "wrapped": '<pre><code class="language-python">print(1 &lt; 2)</code></pre>',
+    "large": "x = 1\n" * 5000,
+}
+
+def bleach_clean(code: str) -> str:
+    return bleach.clean(code, tags=[], attributes={})
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'snippet':<12}{'bleach':>12}{'fast path':>12}{'speedup':>10}  rewrites code (bleach/fast)")
+    for name, code in SNIPPETS.items():
+        runs = max(1, number // 50) if name == "large" else number
+        slow = timeit(lambda: bleach_clean(code), number=runs) / runs
+        fast = timeit(lambda: myx.sanitize_code(code), number=runs) / runs
+        print(
+            f"{name:<12}{slow * 1e6:>10.1f}us{fast * 1e6:>10.2f}us{slow / fast:>9.0f}x  "
+            f"{bleach_clean(code) != code}/{myx.sanitize_code(code) != code}"
+        )
+    myx.executor.python_pool.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -10,21 +10,35 @@ import aiohttp
 import asyncio
 import requests
 import traceback
+import hashlib
+import codecs
 import contextlib
+import queue
+import random
+import atexit
+import threading
 import cloudscraper
-from time import time
+from time import time, perf_counter, monotonic
 from os import environ as env
 from pyrogram import Client, filters
 from bs4 import BeautifulSoup
 from inspect import getfullargspec
 from pyrogram.enums import ParseMode
-from typing import Optional, Tuple, Any, List
-from pyrogram.errors import MessageTooLong
+from typing import Optional, Tuple, Any, List, Dict
+from collections import OrderedDict, deque
+from types import MappingProxyType, ModuleType
+from pyrogram.errors import MessageTooLong, FloodWait
 from pyrogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup
 import ast
+import zlib
+import builtins
+import functools
 import subprocess
 import multiprocessing
 import tempfile
+import itertools
+import math
+import shutil
 from pathlib import Path
 import docker
 import redis
@@ -32,20 +46,16 @@ import ray
 import pydantic
 import structlog
 import loguru
-from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, multiprocess, start_http_server
 from rich.console import Console
 from rich.table import Table
 from cachetools import TTLCache
 import orjson
 import msgpack
-import bleach
-from tenacity import retry, stop_after_attempt, wait_exponential
 import psutil
 import resource
 from tqdm import tqdm
 import humanize
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from concurrent.futures import ThreadPoolExecutor
@@ -53,20 +63,127 @@ import pyinstrument
 import platform
 import shlex
 from datetime import datetime
+from myx_runtime import (
+    Language, InfrastructureError, ExecutionResult, OutputBuffer,
+    code_cache, Lazy, myEval, format_exception, readable_Time, WORKER_PRELOAD, _python_worker_main,
+    ProcessSandbox, SubprocessRunner, RaySnippetActor,
+)
+
+class LogSink:
+    def __init__(self, batch_size: int = 256, flush_interval: float = 0.5, maxsize: int = 10000, start: bool = True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = 1.0
+        self.max_field_chars = 512
+        self.dropped = 0
+        self.sampled_out = 0
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.execution_log = loguru.logger.bind(execution=True)
+        self.thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        if start:
+            self.thread.start()
+            atexit.register(self.close)
+
+    def put(self, kind: str, payload):
+        try:
+            self.queue.put_nowait((kind, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def record(self, record: dict):
+        if record.get("success") and self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        for key, value in record.items():
+            if isinstance(value, str) and len(value) > self.max_field_chars:
+                record[key] = f"{value[:self.max_field_chars]}... [{len(value) - self.max_field_chars} chars truncated]"
+        self.put("record", record)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] != "stop":
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                sys.__stderr__.write(f"log sink write failed: {e}\n")
+            if batch[-1][0] == "stop":
+                return
+
+    def _write(self, batch):
+        lines = [payload for kind, payload in batch if kind == "line"]
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+        for kind, payload in batch:
+            if kind == "record":
+                self.execution_log.info(orjson.dumps(payload).decode())
+        rows = [row for kind, payload in batch if kind == "table" for row in payload]
+        if rows:
+            table = Table(title="Execution Results")
+            table.add_column("Language", style="cyan")
+            table.add_column("Success", style="green")
+            table.add_column("Time", style="magenta")
+            table.add_column("Output", style="white", overflow="fold")
+            for language, success, elapsed, output in rows:
+                table.add_row(language, str(success), humanize.naturaldelta(elapsed), output)
+            console.print(table)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(("stop", None))
+            self.thread.join(timeout=2)
+
+class QueuedLogger:
+    def __init__(self, sink: LogSink):
+        self.sink = sink
 
-structlog.configure(processors=[structlog.processors.JSONRenderer()])
+    def msg(self, message: str):
+        self.sink.put("line", message)
+
+    log = debug = info = warn = warning = error = critical = exception = fatal = failure = msg
+
+BOT_PROCESS = not getattr(multiprocessing.current_process(), "_inheriting", False)
+console = Console()
+log_sink = LogSink(start=BOT_PROCESS)
+structlog.configure(
+    processors=[structlog.processors.JSONRenderer()],
+    logger_factory=lambda *args: QueuedLogger(log_sink),
+)
 logger = structlog.get_logger()
-loguru.logger.add("execution.log", rotation="10 MB")
+loguru.logger.remove()
+loguru.logger.add("execution.log", rotation="10 MB", filter=lambda record: record["extra"].get("execution"))
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+BYTES_BUCKETS = (0, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
 EXECUTION_COUNT = Counter("code_executions_total", "Total code executions", ["language"])
-EXECUTION_TIME = Histogram("code_execution_duration_seconds", "Execution duration", ["language"])
-console = Console()
-try:
-    redis_client = redis.Redis(host="localhost", port=6379, db=0)
-    redis_client.ping()
-except redis.ConnectionError as e:
-    logger.error(f"Redis connection failed: {e}")
-    redis_client = None
-cache = TTLCache(maxsize=1000, ttl=3600)
+EXECUTION_TIME = Histogram("code_execution_duration_seconds", "Execution duration", ["language"], buckets=LATENCY_BUCKETS)
+QUEUE_WAIT = Histogram("code_execution_queue_wait_seconds", "Time spent waiting for an execution slot", ["pool"], buckets=LATENCY_BUCKETS)
+SPAWN_LATENCY = Histogram("code_execution_spawn_seconds", "Process and worker spawn latency", ["kind"], buckets=LATENCY_BUCKETS)
+COMPILE_TIME = Histogram("code_execution_compile_seconds", "myEval parse/transform/compile time on cache misses", buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter("code_execution_cache_requests_total", "Cache lookups per cache and tier", ["cache", "tier", "result"])
+OUTPUT_BYTES = Histogram("code_execution_output_bytes", "Captured output size", ["language", "stream"], buckets=BYTES_BUCKETS)
+TIMEOUTS = Counter("code_execution_timeouts_total", "Executions that hit the timeout", ["language"])
+ROUTES = Counter("code_execution_routes_total", "Executions per dispatch route", ["language", "route"])
+COALESCED = Counter("code_executions_coalesced_total", "Executions saved by joining an identical in-flight run", ["language"])
+RETRIES = Counter("code_execution_retries_total", "Executions retried after an infrastructure fault", ["kind"])
+KILLS = Counter("code_execution_kills_total", "Processes and workers killed", ["reason"])
+IN_FLIGHT = Gauge("code_executions_in_flight", "Executions currently running", ["language"], multiprocess_mode="livesum")
+TELEGRAM_SEND_LATENCY = Histogram("telegram_send_seconds", "Telegram API send/edit latency", ["method"], buckets=LATENCY_BUCKETS)
+redis_client = None
+if BOT_PROCESS:
+    try:
+        redis_client = redis.Redis(host="localhost", port=6379, db=0)
+        redis_client.ping()
+    except redis.ConnectionError as e:
+        logger.error(f"Redis connection failed: {e}")
+        redis_client = None
 
 var = {}
 teskode = {}
@@ -109,180 +226,229 @@ Fetch = httpx.AsyncClient(
     timeout=httpx.Timeout(20)
 )
 
-async def myEval(code, globs, **kwargs):
-    locs = {}
-    globs = globs.copy()
-    global_args = "_globs"
-    while global_args in globs.keys():
-        global_args = f"_{global_args}"
-    kwargs[global_args] = {}
-    for glob in ["__name__", "__package__"]:
-        kwargs[global_args][glob] = globs[glob]
-    root = ast.parse(code, "exec")
-    code_nodes = root.body
-    ret_name = "_ret"
-    ok = False
-    while True:
-        if ret_name in globs.keys():
-            ret_name = f"_{ret_name}"
-            continue
-        for node in ast.walk(root):
-            if isinstance(node, ast.Name) and node.id == ret_name:
-                ret_name = f"_{ret_name}"
-                break
-            ok = True
-        if ok:
-            break
-    if not code_nodes:
-        return None
-    if not any(isinstance(node, ast.Return) for node in code_nodes):
-        for i in range(len(code_nodes)):
-            if isinstance(code_nodes[i], ast.Expr) and (
-                i == len(code_nodes) - 1 or not isinstance(code_nodes[i].value, ast.Call)
-            ):
-                code_nodes[i] = ast.copy_location(
-                    ast.Expr(
-                        ast.Call(
-                            func=ast.Attribute(
-                                value=ast.Name(id=ret_name, ctx=ast.Load()),
-                                attr="append",
-                                ctx=ast.Load(),
-                            ),
-                            args=[code_nodes[i].value],
-                            keywords=[],
-                        )
-                    ),
-                    code_nodes[-1],
-                )
-    else:
-        for node in code_nodes:
-            if isinstance(node, ast.Return):
-                node.value = ast.List(elts=[node.value], ctx=ast.Load())
-    code_nodes.append(
-        ast.copy_location(
-            ast.Return(value=ast.Name(id=ret_name, ctx=ast.Load())), code_nodes[-1]
-        )
-    )
-    glob_copy = ast.Expr(
-        ast.Call(
-            func=ast.Attribute(
-                value=ast.Call(
-                    func=ast.Name(id="globals", ctx=ast.Load()), args=[], keywords=[]
-                ),
-                attr="update",
-                ctx=ast.Load(),
-            ),
-            args=[],
-            keywords=[
-                ast.keyword(arg=None, value=ast.Name(id=global_args, ctx=ast.Load()))
-            ],
-        )
-    )
-    ast.fix_missing_locations(glob_copy)
-    code_nodes.insert(0, glob_copy)
-    ret_decl = ast.Assign(
-        targets=[ast.Name(id=ret_name, ctx=ast.Store())],
-        value=ast.List(elts=[], ctx=ast.Load()),
-    )
-    ast.fix_missing_locations(ret_decl)
-    code_nodes.insert(1, ret_decl)
-    args = []
-    for a in list(map(lambda x: ast.arg(x, None), kwargs.keys())):
-        ast.fix_missing_locations(a)
-        args += [a]
-    args = ast.arguments(
-        args=[],
-        vararg=None,
-        kwonlyargs=args,
-        kwarg=None,
-        defaults=[],
-        kw_defaults=[None for _ in range(len(args))],
-    )
-    args.posonlyargs = []
-    fun = ast.AsyncFunctionDef(
-        name="tmp", args=args, body=code_nodes, decorator_list=[], returns=None
-    )
-    ast.fix_missing_locations(fun)
-    mod = ast.parse("")
-    mod.body = [fun]
-    comp = compile(mod, "<string>", "exec")
-    exec(comp, {}, locs)
-    r = await locs["tmp"](**kwargs)
-    for i in range(len(r)):
-        if hasattr(r[i], "__await__"):
-            r[i] = await r[i]
-    i = 0
-    while i < len(r) - 1:
-        if r[i] is None:
-            del r[i]
+def start_metrics_server(port: int):
+    registry = REGISTRY
+    if env.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        atexit.register(multiprocess.mark_process_dead, os.getpid())
+    try:
+        start_http_server(port, registry=registry)
+    except OSError as e:
+        if registry is REGISTRY:
+            logger.error(f"Prometheus server failed to start: {e}")
         else:
-            i += 1
-    if len(r) == 1:
-        [r] = r
-    elif not r:
-        r = None
-    return r
-
-def format_exception(exp: BaseException, tb: Optional[List[traceback.FrameSummary]] = None) -> str:
-    if tb is None:
-        tb = traceback.extract_tb(exp.__traceback__)
-    cwd = os.getcwd()
-    for frame in tb:
-        if cwd in frame.filename:
-            frame.filename = os.path.relpath(frame.filename)
-    stack = "".join(traceback.format_list(tb))
-    msg = str(exp)
-    if msg:
-        msg = f": {msg}"
-    return f"Traceback (most recent call last):\n{stack}{type(exp).__name__}{msg}"
-
-def readable_Time(seconds: float) -> str:
-    result = ""
-    (days, remainder) = divmod(seconds, 86400)
-    days = int(days)
-    if days != 0:
-        result += f"{days}d:"
-    (hours, remainder) = divmod(remainder, 3600)
-    hours = int(hours)
-    if hours != 0:
-        result += f"{hours}h:"
-    (minutes, seconds) = divmod(remainder, 60)
-    minutes = int(minutes)
-    if minutes != 0:
-        result += f"{minutes}m:"
-    seconds = int(seconds)
-    result += f"{seconds}s"
-    return result or "0.1s"
+            logger.info(f"Metrics port {port} is served by another bot process")
+
+@contextlib.asynccontextmanager
+async def observe_send(method: str):
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        TELEGRAM_SEND_LATENCY.labels(method=method).observe(perf_counter() - started)
+
+code_cache.on_lookup = lambda hit: CACHE_REQUESTS.labels(cache="code", tier="memory", result="hit" if hit else "miss").inc()
+code_cache.on_compile = COMPILE_TIME.observe
+
+def _sticker_id(msg):
+    reply = getattr(msg, "reply_to_message", None)
+    sticker = getattr(reply, "sticker", None) if reply else None
+    return sticker.file_id if sticker else None
+
+def message_vars(msg) -> dict:
+    return {"msg": msg, "m": msg, "user": getattr(msg, "from_user", None), "send": getattr(msg, "reply", None)}
+
+def lazy_message_vars(msg) -> dict:
+    return {"reply": Lazy(getattr, msg, "reply_to_message", None), "sticker": Lazy(_sticker_id, msg)}
+
+MESSAGE_NAMES = frozenset(("msg", "m", "user", "send", "stdout", "print", "reply", "sticker"))
+
+EX_FLAGS = {"--isolated": "isolated", "--profile": "profile", "--profile-html": "profile_html", "--session": "session"}
+DEFAULT_SESSION = "default"
+
+def parse_ex_flags(code: str) -> Tuple[dict, str]:
+    flags = {}
+    while True:
+        parts = code.split(None, 1)
+        flag, _, value = parts[0].partition("=") if parts else ("", "", "")
+        if flag not in EX_FLAGS:
+            return flags, code
+        flags[EX_FLAGS[flag]] = value or True
+        code = parts[1] if len(parts) == 2 else ""
 
 async def eos_Send(msg, **kwargs):
     func = msg.edit if msg.from_user.is_self else msg.reply
     spec = getfullargspec(func.__wrapped__).args
-    await func(**{k: v for k, v in kwargs.items() if k in spec})
-
-class Language:
-    PYTHON = "python"
-    JAVASCRIPT = "javascript"
-    SHELL = "shell"
-    BASH = "bash"
-
-class ExecutionResult(pydantic.BaseModel):
-    stdout: str
-    stderr: str
-    returncode: int
-    language: str
-    execution_time: float
-    success: bool = pydantic.Field(default_factory=lambda: False)
+    async with observe_send("edit" if msg.from_user.is_self else "reply"):
+        await func(**{k: v for k, v in kwargs.items() if k in spec})
 
-    @pydantic.validator("language")
-    def validate_language(cls, v):
-        valid_languages = {Language.PYTHON, Language.JAVASCRIPT, Language.SHELL, Language.BASH}
-        if v not in valid_languages:
-            raise ValueError(f"Language must be one of {valid_languages}")
-        return v
+TELEGRAM_ARTIFACTS = str.maketrans({
+    "\u00a0": " ",
+    "\u2028": "\n",
+    "\u2029": "\n",
+    "\u200b": None,
+    "\u200c": None,
+    "\u200d": None,
+    "\u2060": None,
+    "\ufeff": None,
+})
+TELEGRAM_WRAPPER = re.compile(r"\A\s*<(pre|code)(?:\s[^>]*)?>(.*)</\1>\s*\Z", re.DOTALL)
+
+def sanitize_code(code: str) -> str:
+    if not code.isascii():
+        code = code.translate(TELEGRAM_ARTIFACTS)
+    if code.lstrip()[:1] == "<" and TELEGRAM_WRAPPER.match(code):
+        while wrapped := TELEGRAM_WRAPPER.match(code):
+            code = wrapped.group(2)
+        code = html.unescape(code)
+    return code
+
+class LiveOutput:
+    next_edit: Dict[int, float] = {}
+
+    def __init__(self, message: Message, interval: float, tail_chars: int = 3000):
+        self.message = message
+        self.chat_id = message.chat.id
+        self.interval = interval
+        self.tail_chars = tail_chars
+        self.buffer = ""
+        self.last_text = None
+        self.pending = None
+
+    def _reserve(self) -> float:
+        now = monotonic()
+        if len(self.next_edit) > 1024:
+            for chat_id in [c for c, at in self.next_edit.items() if at < now]:
+                del self.next_edit[chat_id]
+        slot = max(now, self.next_edit.get(self.chat_id, 0.0))
+        self.next_edit[self.chat_id] = slot + self.interval
+        return slot - now
+
+    def feed(self, chunk: str):
+        self.buffer = (self.buffer + chunk)[-self.tail_chars:]
+        if self.pending is None or self.pending.done():
+            self.pending = asyncio.ensure_future(self._flush(self._reserve()))
+
+    async def _flush(self, delay: float):
+        await asyncio.sleep(delay)
+        text = f"**Running...**\n<pre>{html.escape(self.buffer.strip()) or '...'}</pre>"
+        if text == self.last_text:
+            return
+        try:
+            async with observe_send("live_edit"):
+                await self.message.edit(text)
+            self.last_text = text
+        except FloodWait as e:
+            self.next_edit[self.chat_id] = max(self.next_edit.get(self.chat_id, 0.0), monotonic() + e.value)
+        except Exception as e:
+            logger.error(f"Live output edit failed: {e}")
+
+    async def close(self):
+        if self.pending and not self.pending.done():
+            self.pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.pending
+
+DOCKER_IMAGES = {
+    Language.PYTHON: "python:3.11-slim",
+    Language.JAVASCRIPT: "node:20-slim",
+    Language.BASH: "bash:5",
+    Language.SHELL: "bash:5",
+}
+
+DOCKER_PYTHON = """import ast, sys
+tree = ast.parse(sys.argv[1], "<snippet>")
+last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+scope = {"__name__": "__main__"}
+exec(compile(tree, "<snippet>", "exec"), scope)
+if last is not None:
+    value = eval(compile(ast.Expression(last.value), "<snippet>", "eval"), scope)
+    if value is not None:
+        print(value)
+"""
+
+DOCKER_COMMANDS = {
+    Language.PYTHON: ["python3", "-c", DOCKER_PYTHON],
+    Language.JAVASCRIPT: ["node", "-e"],
+    Language.BASH: ["bash", "-c"],
+    Language.SHELL: ["bash", "-c"],
+}
+
+LANGUAGE_ALIASES = {
+    "python": Language.PYTHON,
+    "py": Language.PYTHON,
+    "javascript": Language.JAVASCRIPT,
+    "js": Language.JAVASCRIPT,
+    "bash": Language.BASH,
+}
+SHELL_COMMANDS = (
+    "echo|ls|pwd|cd|cat|grep|rm|mkdir|cp|mv|touch|chmod|chown|curl|wget|apt|apt-get|pip|pip3|npm|git|ps|df|du|"
+    "uname|whoami|sudo|find|head|tail|wc|sed|awk|sort|uniq|ping|top|free|neofetch|kill|pkill|env|which|tar|unzip"
+)
+LANGUAGE_PATTERNS = [
+    (Language.PYTHON, 3, r"^[ \t]*(?:async[ \t]+)?def[ \t]+\w+[ \t]*\(.*\)[ \t]*(?:->.+)?:[ \t]*$"),
+    (Language.PYTHON, 3, r"^[ \t]*class[ \t]+\w+(?:\(.*\))?[ \t]*:[ \t]*$"),
+    (Language.PYTHON, 3, r"^[ \t]*from[ \t]+[\w.]+[ \t]+import\b"),
+    (Language.PYTHON, 2, r"^[ \t]*import[ \t]+[\w.]+(?:[ \t]*,[ \t]*[\w.]+)*(?:[ \t]+as[ \t]+\w+)?[ \t]*$"),
+    (Language.PYTHON, 3, r"^[ \t]*(?:if|elif|else|for|while|with|try|except|finally)\b[^\n;{]*:[ \t]*(?:#.*)?$"),
+    (Language.PYTHON, 3, r"\b(?:elif|None|True|False|lambda|nonlocal)\b"),
+    (Language.PYTHON, 2, r"\bprint\("),
+    (Language.PYTHON, 2, r"\b(?:len|range|enumerate|isinstance|str|int|dict|list)\("),
+    (Language.PYTHON, 2, r"\b[frb]{1,2}[\"']"),
+    (Language.PYTHON, 2, r"\b(?:self|__\w+__)\b"),
+    (Language.PYTHON, 1, r"\b(?:msg|m|app|reply|user)\.\w+"),
+    (Language.PYTHON, 1, r"\b(?:and|or|not|in|is)[ \t]"),
+    (Language.JAVASCRIPT, 4, r"\bconsole\.\w+\("),
+    (Language.JAVASCRIPT, 4, r"^[ \t]*import\b.*\bfrom[ \t]*[\"']"),
+    (Language.JAVASCRIPT, 3, r"\bfunction\b[ \t]*\w*[ \t]*\("),
+    (Language.JAVASCRIPT, 3, r"^[ \t]*(?:let|const|var)[ \t]+[\w{\[]"),
+    (Language.JAVASCRIPT, 3, r"===|!=="),
+    (Language.JAVASCRIPT, 3, r"\brequire\([\"']"),
+    (Language.JAVASCRIPT, 3, r"^[ \t]*export[ \t]+(?:default|const|function|class)\b"),
+    (Language.JAVASCRIPT, 3, r"\b(?:null|undefined|typeof|instanceof)\b"),
+    (Language.JAVASCRIPT, 2, r"=>"),
+    (Language.JAVASCRIPT, 2, r"\bnew[ \t]+[A-Z]\w*\("),
+    (Language.JAVASCRIPT, 2, r"\b(?:document|window|JSON|Math|Promise|process)\.\w+"),
+    (Language.JAVASCRIPT, 1, r"\)[ \t]*\{[ \t]*$"),
+    (Language.JAVASCRIPT, 1, r";[ \t]*$"),
+    (Language.BASH, 5, r"\A#!.*\b(?:ba|z)?sh\b"),
+    (Language.BASH, 3, rf"^[ \t]*(?:sudo[ \t]+)?(?:{SHELL_COMMANDS})(?=[ \t]+[^=(.\s]|[ \t]*$|[ \t]*[|;&>])"),
+    (Language.BASH, 3, rf"\|[ \t]*(?:{SHELL_COMMANDS}|xargs|tee|tr|cut)\b"),
+    (Language.BASH, 4, r"^[ \t]*(?:if|while|for|until)\b.*;[ \t]*(?:then|do)\b"),
+    (Language.BASH, 3, r"^[ \t]*(?:fi|done|esac|then|do)\b"),
+    (Language.BASH, 3, r"[0-9]?>&[0-9]|>[ \t]*/dev/null|\$\(|`[^`\n]+`"),
+    (Language.BASH, 2, r"\$(?:\{\w+[^}]*\}|\w+|[@#?$!*0-9])"),
+    (Language.BASH, 2, r"^[ \t]*[A-Z_][A-Z0-9_]*=\S"),
+    (Language.BASH, 1, r"(?<=[ \t])--?[a-zA-Z][\w-]*"),
+    (Language.BASH, 1, r"&&|\|\|"),
+]
+LANGUAGE_REGEX = re.compile(
+    "|".join(f"(?P<p{i}>{pattern})" for i, (_, _, pattern) in enumerate(LANGUAGE_PATTERNS)), re.MULTILINE
+)
+LANGUAGE_WEIGHTS = {f"p{i}": (lang, weight) for i, (lang, weight, _) in enumerate(LANGUAGE_PATTERNS)}
+
+def detect_language(code: str, max_hits: int = 3) -> Tuple[str, float]:
+    scores = {Language.PYTHON: 0.0, Language.JAVASCRIPT: 0.0, Language.BASH: 0.0}
+    hits = {}
+    for match in LANGUAGE_REGEX.finditer(code):
+        group = match.lastgroup
+        hits[group] = hits.get(group, 0) + 1
+        if hits[group] <= max_hits:
+            lang, weight = LANGUAGE_WEIGHTS[group]
+            scores[lang] += weight
+    total = sum(scores.values())
+    if not total:
+        return Language.PYTHON, 0.0
+    lang = max(scores, key=scores.get)
+    return lang, scores[lang] / total
 
 class CodeSnippet(pydantic.BaseModel):
     code: str
     language: str
+    isolated: bool = False
+    profile: Optional[str] = None
+    session: Optional[str] = None
 
     @pydantic.validator("language")
     def validate_language(cls, v):
@@ -294,47 +460,1147 @@ class CodeSnippet(pydantic.BaseModel):
 class ExecutionConfig(pydantic.BaseModel):
     timeout: float = 10.0
     max_processes: int = multiprocessing.cpu_count()
+    python_workers: int = min(4, multiprocessing.cpu_count())
+    worker_max_runs: int = 100
+    worker_max_memory_mb: int = 256
+    node_workers: int = 2
     use_docker: bool = False
+    docker_images: dict = pydantic.Field(default_factory=lambda: dict(DOCKER_IMAGES))
+    docker_pool_size: int = 2
+    docker_max_runs: int = 1
     max_memory_mb: int = 512
+    max_cpu_seconds: int = 0
+    max_child_processes: int = 64
+    max_open_files: int = 256
+    cgroup_root: Optional[str] = env.get("CODEEXEC_CGROUP")
     retry_attempts: int = 3
+    retry_budget: float = 2.0
+    retry_base_delay: float = 0.05
+    retry_max_delay: float = 0.5
     cache_results: bool = True
+    stream_output: bool = True
+    stream_interval: float = 3.0
+    max_output_bytes: int = 64 * 1024
+    profile_interval: float = 0.001
+    profile_top_frames: int = 15
+    metrics_port: int = int(env.get("METRICS_PORT", "8001"))
+    route_cpu_bound: bool = True
+    max_concurrent_executions: int = 2 * multiprocessing.cpu_count()
+    max_executions_per_user: int = 2
+    max_executions_per_chat: int = 4
+    user_weights: dict = {}
+    use_ray: bool = env.get("USE_RAY", "0") == "1"
+    ray_actors: int = max(1, multiprocessing.cpu_count() // 2)
+    ray_max_in_flight: int = 2 * max(1, multiprocessing.cpu_count() // 2)
+    console_table: bool = env.get("DEBUG_TABLE", "0") == "1"
+    log_sample_rate: float = 1.0
+    log_max_output_chars: int = 512
+    history_size: int = 1000
+    history_dir: Optional[str] = env.get("HISTORY_DIR", "history")
+    history_segment_bytes: int = 8 * 1024 * 1024
+    history_max_segments: int = 32
+    max_sessions: int = 64
+    session_idle_timeout: float = 1800.0
+    cache_ttl: int = 3600
+    cache_memory_bytes: int = 64 * 1024 * 1024
+    cache_max_entry_bytes: int = 1024 * 1024
+    cache_dir: Optional[str] = env.get("RESULT_CACHE_DIR")
+    cache_disk_bytes: int = 512 * 1024 * 1024
+
+    def sandbox_limits(self) -> dict:
+        return {
+            "memory_bytes": self.max_memory_mb * 1024 * 1024,
+            "cpu_seconds": self.max_cpu_seconds or math.ceil(self.timeout) + 1,
+            "max_processes": self.max_child_processes,
+            "max_open_files": self.max_open_files,
+            "cgroup_root": self.cgroup_root,
+        }
+
+class ResultCache:
+    TIERS = ("memory", "redis", "disk")
+
+    def __init__(self, config: ExecutionConfig, redis_client=None):
+        self.ttl = config.cache_ttl
+        self.max_entry_bytes = config.cache_max_entry_bytes
+        self.memory = TTLCache(maxsize=config.cache_memory_bytes, ttl=config.cache_ttl, getsizeof=len)
+        self.redis = redis_client
+        self.disk_path = Path(config.cache_dir) if config.cache_dir else None
+        self.disk_max_bytes = config.cache_disk_bytes
+        self.disk_size = 0
+        self.disk_lock = threading.Lock()
+        self.hits = dict.fromkeys(self.TIERS, 0)
+        self.misses = 0
+        self.disk_evictions = 0
+        if self.disk_path:
+            try:
+                self.disk_path.mkdir(parents=True, exist_ok=True)
+                self.disk_size = sum(p.stat().st_size for p in self.disk_path.glob("*.msgpack"))
+            except OSError as e:
+                logger.error(f"Disk cache unavailable at {self.disk_path}: {e}")
+                self.disk_path = None
+
+    @staticmethod
+    def make_key(code: str, lang: str, variant: str = "") -> str:
+        digest = hashlib.blake2b(code.encode(), digest_size=20).hexdigest()
+        return f"exec:{lang}:{variant}:{digest}" if variant else f"exec:{lang}:{digest}"
+
+    def _record(self, tier: str, data: Optional[bytes]):
+        if data is not None:
+            self.hits[tier] += 1
+        CACHE_REQUESTS.labels(cache="result", tier=tier, result="miss" if data is None else "hit").inc()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self.memory.get(key)
+        self._record("memory", data)
+        if data is not None:
+            return data
+        if self.redis:
+            data = await asyncio.to_thread(self._redis_get, key)
+            self._record("redis", data)
+            if data is not None:
+                self._memory_set(key, data)
+                return data
+        if self.disk_path:
+            data = await asyncio.to_thread(self._disk_get, key)
+            self._record("disk", data)
+            if data is not None:
+                self._memory_set(key, data)
+                if self.redis:
+                    await asyncio.to_thread(self._redis_set, key, data)
+                return data
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, data: bytes):
+        if len(data) > self.max_entry_bytes:
+            return
+        self._memory_set(key, data)
+        if self.redis or self.disk_path:
+            await asyncio.to_thread(self._persist, key, data)
+
+    def _persist(self, key: str, data: bytes):
+        if self.redis:
+            self._redis_set(key, data)
+        if self.disk_path:
+            self._disk_set(key, data)
+
+    def _memory_set(self, key: str, data: bytes):
+        try:
+            self.memory[key] = data
+        except ValueError:
+            pass
+
+    def _redis_get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.redis.get(key)
+        except Exception as e:
+            logger.error(f"Redis cache get failed: {e}")
+            return None
+
+    def _redis_set(self, key: str, data: bytes):
+        try:
+            self.redis.setex(key, self.ttl, data)
+        except Exception as e:
+            logger.error(f"Redis cache set failed: {e}")
+
+    def _disk_file(self, key: str) -> Path:
+        return self.disk_path / f"{key.replace(':', '_')}.msgpack"
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        file_path = self._disk_file(key)
+        try:
+            if time() - file_path.stat().st_mtime > self.ttl:
+                self._disk_remove(file_path)
+                return None
+            return file_path.read_bytes()
+        except OSError:
+            return None
+
+    def _disk_set(self, key: str, data: bytes):
+        file_path = self._disk_file(key)
+        tmp_path = file_path.with_suffix(".tmp")
+        with self.disk_lock:
+            try:
+                previous = file_path.stat().st_size if file_path.exists() else 0
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, file_path)
+                self.disk_size += len(data) - previous
+            except OSError as e:
+                logger.error(f"Disk cache set failed for {file_path}: {e}")
+                return
+            if self.disk_size > self.disk_max_bytes:
+                self._disk_evict()
+
+    def _disk_evict(self):
+        files = sorted(self.disk_path.glob("*.msgpack"), key=lambda p: p.stat().st_mtime)
+        target = self.disk_max_bytes * 0.9
+        for file_path in files:
+            if self.disk_size <= target:
+                break
+            self._disk_remove(file_path)
+            self.disk_evictions += 1
+
+    def _disk_remove(self, file_path: Path):
+        try:
+            size = file_path.stat().st_size
+            file_path.unlink()
+            self.disk_size -= size
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        lookups = sum(self.hits.values()) + self.misses
+        tiers = {
+            tier: {"hits": hits, "hit_ratio": hits / lookups if lookups else 0.0}
+            for tier, hits in self.hits.items()
+        }
+        tiers["memory"]["bytes"] = self.memory.currsize
+        tiers["disk"]["bytes"] = self.disk_size
+        tiers["disk"]["evictions"] = self.disk_evictions
+        return {"lookups": lookups, "misses": self.misses, "tiers": tiers}
+
+class HistoryEntry:
+    __slots__ = ("timestamp", "user_id", "chat_id", "language", "digest", "execution_time", "success", "route")
+
+    def __init__(self, timestamp: float, user_id: int, chat_id: int, language: str, digest: str,
+                 execution_time: float, success: bool, route: str):
+        self.timestamp = timestamp
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.language = language
+        self.digest = digest
+        self.execution_time = execution_time
+        self.success = success
+        self.route = route
+
+    def dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+class HistoryLog:
+    def __init__(self, path: str, segment_bytes: int, max_segments: int):
+        self.path = Path(path)
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        self.segments = OrderedDict()
+        self.active = None
+        self.active_file = None
+        self.path.mkdir(parents=True, exist_ok=True)
+        for segment in sorted(self.path.glob("*.seg")):
+            self.segments[segment] = self._load_index(segment)
+
+    @staticmethod
+    def _frames(segment: Path):
+        with open(segment, "rb") as f:
+            while header := f.read(4):
+                if len(header) < 4:
+                    return
+                body = f.read(int.from_bytes(header, "big"))
+                try:
+                    yield msgpack.unpackb(zlib.decompress(body))
+                except (zlib.error, ValueError, msgpack.ExtraData):
+                    return
+
+    def _load_index(self, segment: Path) -> dict:
+        index_file = segment.with_suffix(".idx")
+        try:
+            return msgpack.unpackb(index_file.read_bytes())
+        except (OSError, ValueError):
+            index = {"first": None, "last": None, "users": [], "count": 0}
+            for record in self._frames(segment):
+                self._update_index(index, record)
+            return index
+
+    @staticmethod
+    def _update_index(index: dict, record: dict):
+        index["first"] = index["first"] or record["timestamp"]
+        index["last"] = record["timestamp"]
+        if record["user_id"] not in index["users"]:
+            index["users"].append(record["user_id"])
+        index["count"] += 1
+
+    def _write_index(self, segment: Path):
+        try:
+            segment.with_suffix(".idx").write_bytes(msgpack.packb(self.segments[segment]))
+        except OSError as e:
+            logger.error(f"History index write failed for {segment}: {e}")
+
+    def _rotate(self, timestamp: float):
+        if self.active_file:
+            self.active_file.close()
+            self._write_index(self.active)
+        self.active = self.path / f"{int(timestamp * 1000):015d}.seg"
+        self.active_file = open(self.active, "ab")
+        self.segments[self.active] = {"first": None, "last": None, "users": [], "count": 0}
+        while len(self.segments) > self.max_segments:
+            oldest, _ = self.segments.popitem(last=False)
+            for file_path in (oldest, oldest.with_suffix(".idx")):
+                file_path.unlink(missing_ok=True)
+
+    def append(self, record: dict):
+        body = zlib.compress(msgpack.packb(record))
+        with self.lock:
+            try:
+                if self.active_file is None or self.active_file.tell() + len(body) > self.segment_bytes:
+                    self._rotate(record["timestamp"])
+                self.active_file.write(len(body).to_bytes(4, "big") + body)
+                self.active_file.flush()
+                self._update_index(self.segments[self.active], record)
+            except OSError as e:
+                logger.error(f"History append failed: {e}")
+
+    def query(self, user_id: Optional[int] = None, since: Optional[float] = None, until: Optional[float] = None,
+              offset: int = 0, limit: int = 20) -> List[dict]:
+        with self.lock:
+            segments = [(segment, dict(index)) for segment, index in reversed(self.segments.items())]
+        records = []
+        for segment, index in segments:
+            if not index["count"] or (user_id is not None and user_id not in index["users"]):
+                continue
+            if (since is not None and index["last"] < since) or (until is not None and index["first"] > until):
+                continue
+            matches = [
+                record for record in self._frames(segment)
+                if (user_id is None or record["user_id"] == user_id)
+                and (since is None or record["timestamp"] >= since)
+                and (until is None or record["timestamp"] <= until)
+            ]
+            records.extend(reversed(matches))
+            if len(records) >= offset + limit:
+                break
+        return records[offset:offset + limit]
+
+    def close(self):
+        with self.lock:
+            if self.active_file:
+                self.active_file.close()
+                self._write_index(self.active)
+                self.active_file = None
+
+WORKER_NAMES = frozenset(("re", "json", "aiohttp", "requests", "soup", "asyncio", "traceback", "os", "humantime", "stdout"))
+BUILTIN_NAMES = frozenset(dir(builtins))
+COMPUTE_NODES = (ast.For, ast.While, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.FunctionDef)
+IN_LOOP_NODES = (ast.Await, ast.AsyncFor, ast.AsyncWith, ast.AsyncFunctionDef, ast.Yield, ast.YieldFrom)
+
+PURE_MODULES = frozenset((
+    "math", "cmath", "itertools", "functools", "operator", "collections", "string", "re", "json",
+    "statistics", "fractions", "decimal", "heapq", "bisect", "textwrap", "unicodedata",
+))
+IMPURE_BUILTINS = frozenset(("input", "open", "id", "hash", "globals", "locals", "vars", "exec", "eval", "compile", "__import__", "breakpoint", "help"))
+JS_IMPURE = re.compile(r"\b(?:Math\.random|Date|performance|process|require|import|fetch|setTimeout|setInterval|setImmediate|crypto)\b")
+
+@functools.lru_cache(maxsize=512)
+def scan_python(code: str):
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    bound, loaded, imports = set(), set(), set()
+    compute = in_loop = False
+    for node in ast.walk(tree):
+        in_loop = in_loop or isinstance(node, IN_LOOP_NODES)
+        compute = compute or isinstance(node, COMPUTE_NODES)
+        if isinstance(node, ast.Name):
+            (loaded if isinstance(node.ctx, ast.Load) else bound).add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, ast.alias):
+            bound.add((node.asname or node.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        if isinstance(node, ast.Import):
+            imports.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.add((node.module or "").split(".")[0] if not node.level else "")
+    return in_loop, compute, frozenset(loaded - bound), frozenset(imports)
+
+def classify_python(code: str) -> str:
+    scan = scan_python(code)
+    if scan is None:
+        return "loop"
+    in_loop, compute, free, _ = scan
+    if in_loop or not compute or free - WORKER_NAMES - BUILTIN_NAMES:
+        return "loop"
+    return "worker"
+
+def is_deterministic(code: str, lang: str) -> bool:
+    if lang == Language.JAVASCRIPT:
+        return not JS_IMPURE.search(code)
+    if lang != Language.PYTHON:
+        return False
+    scan = scan_python(code)
+    if scan is None:
+        return True
+    in_loop, _, free, imports = scan
+    return not (in_loop or imports - PURE_MODULES or free - PURE_MODULES - BUILTIN_NAMES or free & IMPURE_BUILTINS)
+
+class PythonWorker:
+    def __init__(self, ctx, preload, max_output_bytes, limits: Optional[dict] = None):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_python_worker_main, args=(child_conn, preload, max_output_bytes, limits), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+
+    def rss(self) -> int:
+        try:
+            return psutil.Process(self.process.pid).memory_info().rss
+        except psutil.Error:
+            return 0
+
+    async def recv(self, timeout: float):
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = self.conn.fileno()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait_for(ready, timeout=timeout)
+        finally:
+            loop.remove_reader(fd)
+        return self.conn.recv()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self.conn.close()
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+
+    def kill(self):
+        self.process.kill()
+        self.conn.close()
+
+class PythonWorkerPool:
+    def __init__(self, size: int, max_runs: int, max_memory_mb: int, max_output_bytes: int,
+                 limits: Optional[dict] = None, preload=WORKER_PRELOAD):
+        self.ctx = multiprocessing.get_context("forkserver")
+        main_imports = {
+            (value.__name__ if isinstance(value, ModuleType) else getattr(value, "__module__", None) or "").partition(".")[0]
+            for value in vars(sys.modules["__main__"]).values()
+        }
+        self.ctx.set_forkserver_preload(["myx_runtime", *preload, *sorted(main_imports - {"", "__main__", __name__})])
+        self.size = size
+        self.max_runs = max_runs
+        self.max_memory = max_memory_mb * 1024 * 1024
+        self.max_output_bytes = max_output_bytes
+        self.preload = preload
+        self.limits = limits
+        self.slots = asyncio.Semaphore(size)
+        self.lock = threading.Lock()
+        self.idle = []
+        self.threads = ThreadPoolExecutor(max_workers=2, thread_name_prefix="python-worker")
+        self.recycled = 0
+        self.crashed = 0
+        for _ in range(size):
+            self.threads.submit(self._spawn_idle)
+
+    async def run(self, code: str, timeout: float) -> ExecutionResult:
+        queued = perf_counter()
+        async with self.slots:
+            QUEUE_WAIT.labels(pool="python").observe(perf_counter() - queued)
+            try:
+                worker = await self._acquire()
+            except OSError as e:
+                raise InfrastructureError("spawn", f"Python worker spawn failed: {e}") from e
+            try:
+                worker.conn.send(code)
+            except OSError as e:
+                self.crashed += 1
+                self._discard(worker)
+                raise InfrastructureError("worker_crash", f"Python worker unavailable: {e}") from e
+            start_time = time()
+            healthy = False
+            try:
+                result = ExecutionResult(**await worker.recv(timeout))
+                healthy = True
+            except asyncio.TimeoutError:
+                KILLS.labels(reason="worker_timeout").inc()
+                result = ExecutionResult(
+                    stdout="", stderr=f"[Python Worker] Timed out after {timeout}s", returncode=-9,
+                    language=Language.PYTHON, execution_time=time() - start_time, success=False, timed_out=True
+                )
+            except (EOFError, OSError) as e:
+                self.crashed += 1
+                KILLS.labels(reason="worker_crash").inc()
+                raise InfrastructureError("worker_crash", f"Python worker exited: {e}", started=True) from e
+            finally:
+                if not healthy:
+                    self._discard(worker)
+            if not healthy:
+                return result
+            worker.runs += 1
+            if worker.runs >= self.max_runs or worker.rss() > self.max_memory:
+                self.recycled += 1
+                KILLS.labels(reason="recycle").inc()
+                self.threads.submit(self._replace, worker)
+            else:
+                with self.lock:
+                    keep = len(self.idle) < self.size
+                    if keep:
+                        self.idle.append(worker)
+                if not keep:
+                    self.threads.submit(worker.stop)
+            return result
+
+    async def _acquire(self) -> PythonWorker:
+        while True:
+            with self.lock:
+                worker = self.idle.pop() if self.idle else None
+            if worker is None:
+                return await asyncio.get_running_loop().run_in_executor(self.threads, self._spawn)
+            if worker.process.is_alive():
+                return worker
+            self.crashed += 1
+            self._discard(worker)
+
+    def _discard(self, worker: PythonWorker):
+        worker.kill()
+        self.threads.submit(self._spawn_idle)
+
+    def _replace(self, worker: PythonWorker):
+        worker.stop()
+        self._spawn_idle()
+
+    def _spawn(self) -> PythonWorker:
+        started = perf_counter()
+        worker = PythonWorker(self.ctx, self.preload, self.max_output_bytes, self.limits)
+        SPAWN_LATENCY.labels(kind="python_worker").observe(perf_counter() - started)
+        return worker
+
+    def _spawn_idle(self):
+        try:
+            worker = self._spawn()
+        except OSError as e:
+            logger.error(f"Python worker spawn failed: {e}")
+            return
+        with self.lock:
+            self.idle.append(worker)
+
+    def shutdown(self):
+        self.threads.shutdown(wait=True, cancel_futures=True)
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for worker in idle:
+            worker.stop()
+
+NODE_WORKER_SCRIPT = Path(__file__).resolve().parent / "utils" / "vmworker.js"
+
+class NodeWorker:
+    def __init__(self, proc):
+        self.proc = proc
+        self.next_id = 0
+
+    @classmethod
+    async def spawn(cls, max_memory_mb: int) -> "NodeWorker":
+        started = perf_counter()
+        proc = await asyncio.create_subprocess_exec(
+            "node", f"--max-old-space-size={max_memory_mb}", str(NODE_WORKER_SCRIPT),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        worker = cls(proc)
+        try:
+            await asyncio.wait_for(worker.read_frame(), timeout=10)
+        except BaseException:
+            worker.kill()
+            raise
+        SPAWN_LATENCY.labels(kind="node_worker").observe(perf_counter() - started)
+        return worker
+
+    async def read_frame(self) -> dict:
+        header = await self.proc.stdout.readexactly(4)
+        body = await self.proc.stdout.readexactly(int.from_bytes(header, "big"))
+        return orjson.loads(body)
+
+    async def request(self, code: str, timeout: float, max_output_bytes: int) -> dict:
+        self.next_id += 1
+        body = orjson.dumps({
+            "id": self.next_id, "code": code, "timeout": int(timeout * 1000), "max_output": max_output_bytes
+        })
+        self.proc.stdin.write(len(body).to_bytes(4, "big") + body)
+        await self.proc.stdin.drain()
+        return await self.read_frame()
+
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    def kill(self):
+        try:
+            self.proc.kill()
+        except ProcessLookupError:
+            pass
+
+class NodeWorkerPool:
+    def __init__(self, size: int, max_output_bytes: int, max_memory_mb: int):
+        self.size = size
+        self.max_output_bytes = max_output_bytes
+        self.max_memory_mb = max_memory_mb
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+        self.spawning = set()
+        self.started = False
+        self.replaced = 0
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            for _ in range(self.size):
+                self._replenish()
+
+    async def run(self, code: str, timeout: float) -> ExecutionResult:
+        self.start()
+        queued = perf_counter()
+        async with self.slots:
+            QUEUE_WAIT.labels(pool="node").observe(perf_counter() - queued)
+            start_time = time()
+            try:
+                worker = await self._acquire()
+            except Exception as e:
+                raise InfrastructureError("spawn", f"Node worker unavailable: {e}") from e
+            try:
+                reply = await asyncio.wait_for(
+                    worker.request(code, timeout, self.max_output_bytes), timeout=timeout + 1
+                )
+                return ExecutionResult(
+                    stdout=reply["stdout"].strip(), stderr=reply["stderr"].strip(), returncode=reply["returncode"],
+                    language=Language.JAVASCRIPT, execution_time=time() - start_time, success=reply["returncode"] == 0,
+                    truncated=reply["truncated"], timed_out=reply["timed_out"]
+                )
+            except asyncio.TimeoutError:
+                KILLS.labels(reason="worker_timeout").inc()
+                return ExecutionResult(
+                    stdout="", stderr=f"[Node Worker] Timed out after {timeout}s", returncode=-9,
+                    language=Language.JAVASCRIPT, execution_time=time() - start_time, success=False, timed_out=True
+                )
+            except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+                KILLS.labels(reason="worker_crash").inc()
+                raise InfrastructureError("worker_crash", f"Node worker exited: {e}", started=True) from e
+            finally:
+                # Host objects reachable from the vm context are shared by the whole
+                # process, so a worker never runs a second snippet.
+                worker.kill()
+                self.replaced += 1
+                self._replenish()
+
+    async def _acquire(self) -> NodeWorker:
+        if not self.idle and self.spawning:
+            await asyncio.wait(set(self.spawning), return_when=asyncio.FIRST_COMPLETED)
+        while self.idle:
+            worker = self.idle.pop()
+            if worker.alive():
+                return worker
+            self.replaced += 1
+            self._replenish()
+        return await NodeWorker.spawn(self.max_memory_mb)
+
+    def _replenish(self):
+        task = asyncio.ensure_future(self._spawn_idle())
+        self.spawning.add(task)
+        task.add_done_callback(self.spawning.discard)
+
+    async def _spawn_idle(self):
+        try:
+            worker = await NodeWorker.spawn(self.max_memory_mb)
+        except Exception as e:
+            logger.error(f"Node worker spawn failed: {e}")
+            return
+        if len(self.idle) < self.size:
+            self.idle.append(worker)
+        else:
+            worker.kill()
+
+    def shutdown(self):
+        for task in list(self.spawning):
+            task.cancel()
+        while self.idle:
+            self.idle.pop().kill()
+
+class RayActorPool:
+    def __init__(self, size: int, max_in_flight: int, timeout: float, max_output_bytes: int, limits: dict):
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self.limits = limits
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.actor_cls = ray.remote(num_cpus=1, max_concurrency=1)(RaySnippetActor)
+        self.load = {self._spawn(): 0 for _ in range(size)}
+        self.replaced = 0
+        ray.get([actor.ready.remote() for actor in self.load])
+
+    def _spawn(self):
+        return self.actor_cls.remote(self.timeout, self.max_output_bytes, self.limits)
+
+    def _replace(self, actor):
+        if self.load.pop(actor, None) is None:
+            return
+        with contextlib.suppress(Exception):
+            ray.kill(actor, no_restart=True)
+        self.load[self._spawn()] = 0
+        self.replaced += 1
+
+    async def run(self, code: str, lang: str) -> ExecutionResult:
+        queued = perf_counter()
+        async with self.slots:
+            QUEUE_WAIT.labels(pool="ray").observe(perf_counter() - queued)
+            actor = min(self.load, key=self.load.get)
+            self.load[actor] += 1
+            deadline = self.timeout * self.load[actor] + 5
+            start_time = time()
+            try:
+                return ExecutionResult(**await asyncio.wait_for(actor.run.remote(code, lang), deadline))
+            except asyncio.TimeoutError:
+                KILLS.labels(reason="worker_timeout").inc()
+                self._replace(actor)
+                return ExecutionResult(
+                    stdout="", stderr=f"[Ray Actor] No reply after {deadline}s", returncode=-9,
+                    language=lang, execution_time=time() - start_time, success=False, timed_out=True
+                )
+            except ray.exceptions.RayActorError as e:
+                KILLS.labels(reason="worker_crash").inc()
+                self._replace(actor)
+                raise InfrastructureError("worker_crash", f"Ray actor died: {e}", started=True) from e
+            except ray.exceptions.RayError as e:
+                raise InfrastructureError("ray_transport", f"Ray call failed: {e}", started=True) from e
+            finally:
+                if actor in self.load:
+                    self.load[actor] -= 1
+
+    def shutdown(self):
+        for actor in list(self.load):
+            with contextlib.suppress(Exception):
+                ray.kill(actor)
+        self.load.clear()
+
+class ContainerPool:
+    def __init__(self, client, images: dict, size: int, max_runs: int, timeout: float,
+                 max_output_bytes: int, max_memory_mb: int, max_child_processes: int):
+        self.client = client
+        self.images = images
+        self.size = size
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self.max_memory_mb = max_memory_mb
+        self.max_child_processes = max_child_processes
+        self.idle = {lang: [] for lang in images}
+        self.runs = {}
+        self.lock = threading.Lock()
+        self.threads = ThreadPoolExecutor(max_workers=max(2, size * len(set(images.values()))))
+        self.recycled = 0
+        for lang in images:
+            for _ in range(size):
+                self.threads.submit(self._spawn_idle, lang)
+
+    def _start(self, lang: str):
+        started = perf_counter()
+        container = self.client.containers.run(
+            self.images[lang], ["sleep", "infinity"], detach=True, network_disabled=True,
+            mem_limit=f"{self.max_memory_mb}m", pids_limit=self.max_child_processes, read_only=True,
+            tmpfs={"/tmp": "size=64m"}, labels={"codeexec": lang}
+        )
+        SPAWN_LATENCY.labels(kind="container").observe(perf_counter() - started)
+        self.runs[container.id] = 0
+        return container
+
+    def _spawn_idle(self, lang: str):
+        try:
+            container = self._start(lang)
+        except Exception as e:
+            logger.error(f"Container spawn for {lang} failed: {e}")
+            return
+        with self.lock:
+            if len(self.idle[lang]) < self.size:
+                self.idle[lang].append(container)
+                return
+        self._remove(container)
+
+    def _remove(self, container):
+        self.runs.pop(container.id, None)
+        try:
+            container.remove(force=True)
+        except Exception as e:
+            logger.error(f"Container removal failed: {e}")
+
+    def _exec(self, container, code: str, lang: str, out: OutputBuffer, err: OutputBuffer, emit=None):
+        timeout = max(1, math.ceil(self.timeout))
+        cmd = ["timeout", "-k", "1", str(timeout), *DOCKER_COMMANDS[lang], code]
+        api = self.client.api
+        exec_id = api.exec_create(container.id, cmd, workdir="/tmp")["Id"]
+        decoder = codecs.getincrementaldecoder("utf-8")("replace") if emit else None
+        for stdout, stderr in api.exec_start(exec_id, stream=True, demux=True):
+            for sink, chunk in ((out, stdout), (err, stderr)):
+                if not chunk:
+                    continue
+                sink.write(chunk)
+                if decoder:
+                    text = decoder.decode(chunk)
+                    if text:
+                        emit(text)
+        return api.exec_inspect(exec_id)["ExitCode"]
+
+    async def run(self, code: str, lang: str, on_output=None) -> ExecutionResult:
+        loop = asyncio.get_running_loop()
+        emit = (lambda text: loop.call_soon_threadsafe(on_output, text)) if on_output else None
+        queued = perf_counter()
+        with self.lock:
+            container = self.idle[lang].pop() if self.idle[lang] else None
+        if container is None:
+            try:
+                container = await loop.run_in_executor(self.threads, self._start, lang)
+            except Exception as e:
+                raise InfrastructureError("spawn", f"Container start failed: {e}") from e
+        QUEUE_WAIT.labels(pool="docker").observe(perf_counter() - queued)
+        start_time = time()
+        healthy = False
+        out, err = OutputBuffer(self.max_output_bytes), OutputBuffer(self.max_output_bytes)
+        try:
+            exit_code = await asyncio.wait_for(
+                loop.run_in_executor(self.threads, self._exec, container, code, lang, out, err, emit),
+                timeout=self.timeout + 5
+            )
+            healthy = True
+        except asyncio.TimeoutError:
+            KILLS.labels(reason="container_timeout").inc()
+            exit_code = -9
+            err.write(f"Execution timed out after {self.timeout}s".encode())
+        except Exception as e:
+            KILLS.labels(reason="container_error").inc()
+            raise InfrastructureError("docker", f"Container exec failed: {e}", started=True) from e
+        finally:
+            self.runs[container.id] = self.runs.get(container.id, 0) + 1
+            self._release(container, lang, healthy)
+        stderr = err.getvalue()
+        timed_out = exit_code in (-9, 124)
+        if exit_code == 124:
+            stderr = f"{stderr}\nExecution timed out after {self.timeout}s"
+        return ExecutionResult(
+            stdout=out.getvalue().strip(), stderr=stderr.strip(), returncode=exit_code, language=lang,
+            execution_time=time() - start_time, success=exit_code == 0, truncated=out.truncated or err.truncated,
+            timed_out=timed_out
+        )
+
+    def _release(self, container, lang: str, healthy: bool):
+        if healthy and self.runs.get(container.id, 0) < self.max_runs:
+            with self.lock:
+                if len(self.idle[lang]) < self.size:
+                    self.idle[lang].append(container)
+                    return
+        self.recycled += 1
+        self.threads.submit(self._remove, container)
+        self.threads.submit(self._spawn_idle, lang)
+
+    def shutdown(self):
+        with self.lock:
+            containers = [c for idle in self.idle.values() for c in idle]
+            for idle in self.idle.values():
+                idle.clear()
+        for container in containers:
+            self._remove(container)
+        self.threads.shutdown(wait=False)
+
+class Ticket:
+    __slots__ = ("user_id", "chat_id", "priority", "start", "finish", "admitted", "queued_at")
+
+    def __init__(self, user_id: int, chat_id: int, priority: bool, start: float, finish: float):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.priority = priority
+        self.start = start
+        self.finish = finish
+        self.admitted = asyncio.get_running_loop().create_future()
+        self.queued_at = perf_counter()
+
+    def order(self):
+        return (not self.priority, self.finish)
+
+class AdmissionScheduler:
+    def __init__(self, max_concurrent: int, per_user: int, per_chat: int, priority_users=(), weights=None,
+                 feedback_interval: float = 3.0):
+        self.max_concurrent = max_concurrent
+        self.per_user = per_user
+        self.per_chat = per_chat
+        self.priority_users = set(priority_users)
+        self.weights = weights or {}
+        self.feedback_interval = feedback_interval
+        self.running = 0
+        self.user_running = {}
+        self.chat_running = {}
+        self.queues = {}
+        self.last_finish = {}
+        self.virtual_time = 0.0
+        self.admitted = 0
+        self.waited = 0
+
+    def _enqueue(self, user_id: int, chat_id: int) -> Ticket:
+        start = max(self.virtual_time, self.last_finish.get(user_id, 0.0))
+        finish = start + 1.0 / self.weights.get(user_id, 1.0)
+        self.last_finish[user_id] = finish
+        ticket = Ticket(user_id, chat_id, user_id in self.priority_users, start, finish)
+        self.queues.setdefault(user_id, []).append(ticket)
+        return ticket
+
+    def _eligible(self, ticket: Ticket) -> bool:
+        if ticket.priority:
+            return True
+        return (
+            self.user_running.get(ticket.user_id, 0) < self.per_user
+            and self.chat_running.get(ticket.chat_id, 0) < self.per_chat
+        )
+
+    def _dispatch(self):
+        while self.running < self.max_concurrent:
+            heads = [queue[0] for queue in self.queues.values() if self._eligible(queue[0])]
+            if not heads:
+                return
+            ticket = min(heads, key=Ticket.order)
+            self._remove(ticket)
+            self.virtual_time = max(self.virtual_time, ticket.start)
+            self.running += 1
+            self.user_running[ticket.user_id] = self.user_running.get(ticket.user_id, 0) + 1
+            self.chat_running[ticket.chat_id] = self.chat_running.get(ticket.chat_id, 0) + 1
+            ticket.admitted.set_result(None)
+
+    def _remove(self, ticket: Ticket):
+        queue = self.queues[ticket.user_id]
+        queue.remove(ticket)
+        if not queue:
+            del self.queues[ticket.user_id]
+
+    def _release(self, ticket: Ticket):
+        self.running -= 1
+        for counts, key in ((self.user_running, ticket.user_id), (self.chat_running, ticket.chat_id)):
+            counts[key] -= 1
+            if not counts[key]:
+                del counts[key]
+        self._forget(ticket.user_id)
+        self._dispatch()
+
+    def _forget(self, user_id: int):
+        if user_id not in self.queues and not self.user_running.get(user_id):
+            self.last_finish.pop(user_id, None)
+
+    def position(self, ticket: Ticket) -> int:
+        if ticket.admitted.done():
+            return 0
+        order = ticket.order()
+        return 1 + sum(1 for queue in self.queues.values() for other in queue if other.order() < order)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, user_id: int, chat_id: int, on_position=None):
+        ticket = self._enqueue(user_id, chat_id)
+        self._dispatch()
+        queued = not ticket.admitted.done()
+        try:
+            last = None
+            while not ticket.admitted.done():
+                position = self.position(ticket)
+                if on_position and position != last:
+                    last = position
+                    await on_position(position)
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(asyncio.shield(ticket.admitted), self.feedback_interval)
+        except BaseException:
+            if ticket.admitted.done():
+                self._release(ticket)
+            else:
+                self._remove(ticket)
+                ticket.admitted.cancel()
+                self._forget(ticket.user_id)
+                self._dispatch()
+            raise
+        wait = perf_counter() - ticket.queued_at
+        QUEUE_WAIT.labels(pool="admission").observe(wait)
+        self.admitted += 1
+        self.waited += queued
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": sum(len(queue) for queue in self.queues.values()),
+            "admitted": self.admitted,
+            "waited": self.waited,
+        }
+
+def estimate_size(obj, depth: int = 3, seen: Optional[set] = None, sample: int = 32) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen or isinstance(obj, (type, ModuleType)):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if depth <= 0:
+        return size
+    if isinstance(obj, dict):
+        items = [
+            estimate_size(k, depth - 1, seen, sample) + estimate_size(v, depth - 1, seen, sample)
+            for k, v in itertools.islice(obj.items(), sample)
+        ]
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        items = [estimate_size(item, depth - 1, seen, sample) for item in itertools.islice(obj, sample)]
+    elif hasattr(obj, "__dict__"):
+        return size + estimate_size(vars(obj), depth - 1, seen, sample)
+    else:
+        return size
+    if items:
+        size += sum(items) * len(obj) // len(items)
+    return size
+
+class ReplSession:
+    __slots__ = ("name", "base", "namespace", "lock", "created", "last_used", "runs", "memory")
+
+    def __init__(self, name: str, base):
+        self.name = name
+        self.base = base
+        self.namespace = base.copy()
+        self.lock = asyncio.Lock()
+        self.created = self.last_used = monotonic()
+        self.runs = 0
+        self.memory = 0
+
+    def user_vars(self) -> dict:
+        return {
+            k: v for k, v in self.namespace.items()
+            if k != "__builtins__" and k not in MESSAGE_NAMES and self.base.get(k, self) is not v
+        }
+
+    def estimate(self) -> int:
+        self.memory = estimate_size(self.user_vars())
+        return self.memory
+
+class SessionManager:
+    def __init__(self, max_sessions: int, idle_timeout: float):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+        self.evicted = 0
+
+    def acquire(self, base, user_id: int, chat_id: int, name: str) -> ReplSession:
+        self.evict_idle()
+        key = (user_id, chat_id, name)
+        session = self.sessions.get(key)
+        if session is None:
+            session = self.sessions[key] = ReplSession(name, base)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evicted += 1
+        self.sessions.move_to_end(key)
+        session.last_used = monotonic()
+        return session
+
+    def evict_idle(self):
+        cutoff = monotonic() - self.idle_timeout
+        while self.sessions:
+            key, session = next(iter(self.sessions.items()))
+            if session.last_used > cutoff:
+                break
+            del self.sessions[key]
+            self.evicted += 1
+
+    def list(self, user_id: int, chat_id: int) -> List[ReplSession]:
+        self.evict_idle()
+        return [s for (u, c, _), s in self.sessions.items() if u == user_id and c == chat_id]
+
+    def reset(self, user_id: int, chat_id: int, name: str) -> bool:
+        session = self.sessions.get((user_id, chat_id, name))
+        if session is None:
+            return False
+        session.namespace.clear()
+        session.namespace.update(session.base)
+        session.memory = 0
+        return True
+
+    def drop(self, user_id: int, chat_id: int, name: str) -> bool:
+        return self.sessions.pop((user_id, chat_id, name), None) is not None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "evicted": self.evicted,
+            "memory": sum(s.memory for s in self.sessions.values()),
+        }
 
 class CodeExecutor:
     def __init__(self, config: ExecutionConfig):
         self.config = config
-        self.process_pool = multiprocessing.Pool(processes=config.max_processes)
+        self.python_pool = None
+        if platform.system().lower() != "windows" and config.python_workers > 0:
+            self.python_pool = PythonWorkerPool(
+                config.python_workers, config.worker_max_runs, config.worker_max_memory_mb, config.max_output_bytes,
+                config.sandbox_limits() if hasattr(resource, "prlimit") else None
+            )
+        self.node_pool = None
+        if shutil.which("node") and config.node_workers > 0:
+            self.node_pool = NodeWorkerPool(
+                config.node_workers, config.max_output_bytes, config.max_memory_mb
+            )
         self.docker_client = None
         if config.use_docker:
             try:
                 self.docker_client = docker.from_env()
             except Exception as e:
                 logger.error(f"Docker initialization failed: {e}")
+        self.container_pool = None
+        if self.docker_client:
+            self.container_pool = ContainerPool(
+                self.docker_client, config.docker_images, config.docker_pool_size, config.docker_max_runs,
+                config.timeout, config.max_output_bytes, config.max_memory_mb, config.max_child_processes
+            )
         self.loop = asyncio.get_event_loop()
+        if self.node_pool:
+            self.loop.call_soon(self.node_pool.start)
         self.thread_pool = ThreadPoolExecutor(max_workers=config.max_processes)
-        try:
-            ray.init(ignore_reinit_error=True)
-        except Exception as e:
-            logger.error(f"Ray initialization failed: {e}")
-        try:
-            start_http_server(8001)
-        except Exception as e:
-            logger.error(f"Prometheus server failed to start: {e}")
-        self._setup_resource_limits()
+        self.ray_pool = None
+        if config.use_ray:
+            try:
+                ray.init(address="local", num_cpus=config.ray_actors, include_dashboard=False, ignore_reinit_error=True)
+                self.ray_pool = RayActorPool(
+                    config.ray_actors, config.ray_max_in_flight, config.timeout, config.max_output_bytes,
+                    config.sandbox_limits()
+                )
+            except Exception as e:
+                logger.error(f"Ray initialization failed: {e}")
+        start_metrics_server(config.metrics_port)
+        log_sink.sample_rate = config.log_sample_rate
+        log_sink.max_field_chars = config.log_max_output_chars
+        self.result_cache = ResultCache(config, redis_client)
+        self._workspace = None
+        self._script_ids = itertools.count(1)
+        self._inflight = {}
+        self.coalesced = 0
         self.env = {}
-        self.history = []
+        self.history = deque(maxlen=config.history_size)
+        self.history_log = None
+        if config.history_dir:
+            try:
+                self.history_log = HistoryLog(config.history_dir, config.history_segment_bytes, config.history_max_segments)
+            except OSError as e:
+                logger.error(f"History log unavailable at {config.history_dir}: {e}")
         self.platform = self._detect_platform()
-        self.eval_vars = {
+        self.sandbox = ProcessSandbox(**config.sandbox_limits()) if hasattr(resource, "prlimit") else None
+        self.runner = SubprocessRunner(
+            self.sandbox, config.timeout, config.max_output_bytes,
+            on_spawn=SPAWN_LATENCY.labels(kind="subprocess").observe, on_timeout=KILLS.labels(reason="timeout").inc
+        )
+        self.sessions = SessionManager(config.max_sessions, config.session_idle_timeout)
+        self.eval_vars = MappingProxyType({
+            "__name__": __name__,
+            "__package__": __package__,
             "app": app,
             "humantime": readable_Time,
-            "msg": None,
-            "m": None,
             "db": "mongo:localhost/database:7000",
             "var": var,
             "teskode": teskode,
             "re": re,
             "os": os,
-            "user": None,
-            "sticker": None,
             "ParseMode": ParseMode,
             "sendMsg": app.send_message,
             "copyMsg": app.copy_message,
@@ -351,14 +1617,12 @@ class CodeExecutor:
             "cloudscraper": cloudscraper,
             "json": json,
             "aiohttp": aiohttp,
-            "send": None,
-            "stdout": None,
             "traceback": traceback,
             "webscrap": WebScrap,
             "fetch": Fetch,
             "requests": requests,
             "soup": BeautifulSoup,
-        }
+        })
 
     def _detect_platform(self):
         plat = platform.system().lower()
@@ -373,24 +1637,14 @@ class CodeExecutor:
             return "macos"
         return "unknown"
 
-    def _setup_resource_limits(self):
-        try:
-            memory_bytes = self.config.max_memory_mb * 1024 * 1024
-            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
-        except Exception as e:
-            logger.error(f"Failed to set resource limits: {e}")
-
-    def _generate_secure_filename(self, code: str) -> str:
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=16,
-            salt=os.urandom(16),
-            iterations=100000,
-        )
-        return kdf.derive(code.encode()).hex()
+    @property
+    def workspace(self) -> Path:
+        if self._workspace is None:
+            self._workspace = Path(tempfile.mkdtemp(prefix="codeexec-"))
+        return self._workspace
 
     def _sanitize_code(self, code: str) -> str:
-        return bleach.clean(code, tags=[], attributes={})
+        return sanitize_code(code)
 
     def _write_temp_file(self, code: str, lang: str) -> str:
         suffix = {
@@ -399,16 +1653,19 @@ class CodeExecutor:
             Language.SHELL: ".sh",
             Language.BASH: ".bash"
         }[lang]
-        file_name = self._generate_secure_filename(code)
-        file_path = Path(tempfile.gettempdir()) / f"{file_name}{suffix}"
-        file_path.write_text(code)
-        if lang in (Language.SHELL, Language.BASH) and self.platform != "windows":
-            try:
-                file_path.chmod(0o755)
-            except Exception as e:
-                logger.error(f"Failed to set file permissions for {file_path}: {e}")
+        file_path = self.workspace / f"{next(self._script_ids):x}{suffix}"
+        mode = 0o700 if lang in (Language.SHELL, Language.BASH) else 0o600
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+        with os.fdopen(fd, "w") as script:
+            script.write(code)
         return str(file_path)
 
+    def _prepare_script(self, code: str, lang: str):
+        if lang == Language.JAVASCRIPT:
+            return ["node", f"--max-old-space-size={self.config.max_memory_mb}", "-"], code.encode(), None
+        file_path = self._write_temp_file(code, lang)
+        return [file_path], None, file_path
+
     def _cleanup_temp_file(self, file_path: str):
         try:
             Path(file_path).unlink(missing_ok=True)
@@ -416,75 +1673,212 @@ class CodeExecutor:
             logger.error(f"Failed to delete {file_path}: {e}")
 
     def _auto_detect_language(self, code: str) -> str:
-        code = code.strip()
-        py_keywords = ["def ", "import ", "print(", "class ", "async ", "await "]
-        js_keywords = ["console.log", "function ", "var ", "let ", "const ", "=>", "import ", "export "]
-        bash_keywords = ["echo ", "ls", "pwd", "cd ", "cat ", "grep ", "rm "]
-        if any(kw in code for kw in py_keywords):
-            return Language.PYTHON
-        if any(kw in code for kw in js_keywords):
-            return Language.JAVASCRIPT
-        if any(kw in code for kw in bash_keywords):
-            return Language.BASH
-        return Language.PYTHON
-
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=10))
-    async def _execute_single(self, code: str, lang: str, msg: Message = None) -> ExecutionResult:
+        return detect_language(code.strip())[0]
+
+    async def _execute_single(
+        self, code: str, lang: str, msg: Message = None, isolated: bool = False, on_output=None,
+        profile: Optional[str] = None, session: Optional[str] = None
+    ) -> ExecutionResult:
         start_time = time()
+        profile = profile if lang == Language.PYTHON else None
+        isolated = isolated and lang == Language.PYTHON and self.python_pool is not None
+        if session and lang == Language.PYTHON:
+            sender = msg and (msg.from_user or msg.sender_chat)
+            chat_id = msg.chat.id if msg else 0
+            session = self.sessions.acquire(self.eval_vars, sender.id if sender else chat_id, chat_id, session)
+        else:
+            session = None
+
         code = self._sanitize_code(code)
-        cache_key = f"{lang}:{hash(code)}"
-        self.history.append((lang, code))
+        cache_key = ResultCache.make_key(code, lang, "worker" if isolated else "")
+        deterministic = not profile and not session and is_deterministic(code, lang)
+        if self.config.cache_results and deterministic:
+            cached = await self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Cache hit for {cache_key}")
+                return ExecutionResult.from_bytes(cached)
 
-        if self.config.cache_results and cache_key in cache:
-            logger.info(f"Cache hit for {cache_key}")
-            return ExecutionResult(**cache[cache_key])
+        flight = None
+        if deterministic:
+            leader = self._inflight.get(cache_key)
+            if leader is not None:
+                try:
+                    result = await asyncio.shield(leader)
+                    COALESCED.labels(language=lang).inc()
+                    self.coalesced += 1
+                    return result.copy()
+                except asyncio.CancelledError:
+                    if not leader.cancelled():
+                        raise
+            flight = self._inflight[cache_key] = asyncio.get_running_loop().create_future()
 
-        with pyinstrument.Profiler():
-            try:
-                if lang == Language.PYTHON:
-                    result = await self._run_python(code, msg)
-                elif lang == Language.JAVASCRIPT:
-                    result = await self._execute_local(code, lang)
+        IN_FLIGHT.labels(language=lang).inc()
+        result = None
+        try:
+            route = "session" if session else self._route(code, lang, isolated, profile)
+            result = await self._run_with_retry(route, code, lang, msg, on_output, profile, session)
+            result.route = route
+
+            ROUTES.labels(language=lang, route=route).inc()
+            EXECUTION_COUNT.labels(language=lang).inc()
+            EXECUTION_TIME.labels(language=lang).observe(time() - start_time)
+            OUTPUT_BYTES.labels(language=lang, stream="stdout").observe(len(result.stdout))
+            OUTPUT_BYTES.labels(language=lang, stream="stderr").observe(len(result.stderr))
+            if result.timed_out:
+                TIMEOUTS.labels(language=lang).inc()
+
+            if self.config.cache_results and deterministic and not result.timed_out and result.returncode != -9:
+                await self.result_cache.set(cache_key, result.to_bytes())
+
+            log_sink.record({
+                "event": f"Executed {lang} code",
+                "language": lang,
+                "success": result.success,
+                "returncode": result.returncode,
+                "execution_time": result.execution_time,
+                "timed_out": result.timed_out,
+                "truncated": result.truncated,
+                "retries": result.retries,
+                "stdout": result.stdout,
+                "stderr": result.stderr,
+            })
+            return result
+
+        except InfrastructureError as e:
+            logger.error(f"Execution failed after {e.retries} retries: {e}")
+            result = ExecutionResult(
+                stdout="", stderr=f"[Infrastructure Error] {e}", returncode=1, language=lang,
+                execution_time=time() - start_time, success=False, route=route, retries=e.retries
+            )
+            return result
+        except Exception as e:
+            logger.error(f"Execution failed: {str(e)}", exc_info=True)
+            result = ExecutionResult(
+                stdout="", stderr=format_exception(e), returncode=1, language=lang,
+                execution_time=time() - start_time, success=False
+            )
+            return result
+        finally:
+            IN_FLIGHT.labels(language=lang).dec()
+            if flight is not None:
+                if self._inflight.get(cache_key) is flight:
+                    del self._inflight[cache_key]
+                if result is None:
+                    flight.cancel()
                 else:
-                    result = await self._run_bash(code) if self.platform != "windows" else await self._execute_local(code, lang)
-                
-                EXECUTION_COUNT.labels(language=lang).inc()
-                EXECUTION_TIME.labels(language=lang).observe(time() - start_time)
-                
-                if self.config.cache_results and redis_client:
-                    try:
-                        redis_client.setex(cache_key, 3600, msgpack.packb(result.dict()))
-                    except Exception as e:
-                        logger.error(f"Redis cache set failed: {e}")
-                    cache[cache_key] = result.dict()
-                
-                logger.info(f"Executed {lang} code", result=result.dict())
+                    flight.set_result(result.copy())
+
+    async def _dispatch(self, route: str, code: str, lang: str, msg: Message, on_output, profile: Optional[str],
+                        session: Optional[ReplSession] = None) -> ExecutionResult:
+        if route == "session":
+            return await self._run_session(code, msg, session)
+        elif route == "profile":
+            return await self._profile(self._run_python(code, msg), profile)
+        elif route == "docker":
+            return await self.container_pool.run(code, lang, on_output)
+        elif route == "ray":
+            return await self.ray_pool.run(code, lang)
+        elif route == "worker":
+            return await self.python_pool.run(code, self.config.timeout)
+        elif route == "loop":
+            return await self._run_python(code, msg)
+        elif route == "node":
+            return await self.node_pool.run(code, self.config.timeout)
+        elif route == "shell":
+            return await self._run_bash(code, on_output)
+        else:
+            return await self._execute_local(code, lang, on_output)
+
+    async def _run_with_retry(self, route: str, code: str, lang: str, msg: Message, on_output, profile: Optional[str],
+                              session: Optional[ReplSession] = None) -> ExecutionResult:
+        deadline = monotonic() + self.config.retry_budget
+        idempotent = None
+        for attempt in itertools.count():
+            try:
+                result = await self._dispatch(route, code, lang, msg, on_output, profile, session)
+                result.retries = attempt
                 return result
-            
-            except Exception as e:
-                logger.error(f"Execution failed: {str(e)}", exc_info=True)
-                return ExecutionResult(
-                    stdout="", stderr=format_exception(e), returncode=1, language=lang,
-                    execution_time=time() - start_time, success=False
-                )
+            except InfrastructureError as e:
+                if e.started and idempotent is None:
+                    idempotent = is_deterministic(code, lang)
+                delay = random.uniform(0, min(self.config.retry_max_delay, self.config.retry_base_delay * 2 ** attempt))
+                if (
+                    attempt + 1 >= self.config.retry_attempts
+                    or (e.started and not idempotent)
+                    or monotonic() + delay > deadline
+                ):
+                    e.retries = attempt
+                    raise
+                RETRIES.labels(kind=e.kind).inc()
+                logger.info(f"Retrying {lang} execution after {e.kind}: {e}")
+                await asyncio.sleep(delay)
+
+    def _route(self, code: str, lang: str, isolated: bool, profile: Optional[str]) -> str:
+        if lang == Language.PYTHON and profile:
+            return "profile"
+        if self.container_pool and lang in self.container_pool.images and (isolated or lang != Language.PYTHON):
+            return "docker"
+        if self.ray_pool and (isolated or lang != Language.PYTHON):
+            return "ray"
+        if lang == Language.PYTHON:
+            if isolated or (self.python_pool and self.config.route_cpu_bound and classify_python(code) == "worker"):
+                return "worker"
+            return "loop"
+        if lang == Language.JAVASCRIPT:
+            return "node" if self.node_pool else "local"
+        return "shell" if self.platform != "windows" else "local"
+
+    async def _profile(self, run, mode: str) -> ExecutionResult:
+        profiler = pyinstrument.Profiler(interval=self.config.profile_interval, async_mode="enabled")
+        profiler.start()
+        try:
+            result = await run
+        finally:
+            profiler.stop()
+        if mode == "html":
+            result.profile_report = profiler.output_html()
+        else:
+            result.profile_report = self._profile_text(profiler)
+        return result
+
+    def _profile_text(self, profiler) -> str:
+        session = profiler.last_session
+
+        def top(flat_time: str) -> str:
+            lines = profiler.output_text(unicode=True, flat=True, flat_time=flat_time).splitlines()
+            rows = [line for line in lines if line[:1].isdigit()]
+            return "\n".join(f"  {row}" for row in rows[:self.config.profile_top_frames])
 
-    async def _run_python(self, code: str, msg: Message) -> ExecutionResult:
+        return (
+            f"Duration: {session.duration:.3f}s  CPU time: {session.cpu_time:.3f}s  Samples: {session.sample_count}\n\n"
+            f"Top frames by self time:\n{top('self')}\n\n"
+            f"Top frames by total time:\n{top('total')}\n\n"
+            f"Call tree:\n{profiler.output_text(unicode=True)}"
+        )
+
+    async def _run_session(self, code: str, msg: Message, session: ReplSession) -> ExecutionResult:
+        async with session.lock:
+            result = await self._run_python(code, msg, session.namespace)
+            session.runs += 1
+            session.estimate()
+        return result
+
+    async def _run_python(self, code: str, msg: Message, namespace: Optional[dict] = None) -> ExecutionResult:
         start_time = time()
-        out_code = io.StringIO()
-        async def send(*args, **kwargs) -> Message:
-            return await msg.reply(*args, **kwargs)
-        self.eval_vars.update({
-            "msg": msg,
-            "m": msg,
-            "user": msg.from_user,
-            "sticker": msg.reply_to_message.sticker.file_id if msg.reply_to_message and hasattr(msg.reply_to_message, 'sticker') else None,
-            "send": send,
-            "stdout": out_code,
-            "reply": msg.reply_to_message
-        })
+        persist = namespace is not None
+        lazy = lazy_message_vars(msg)
+        if persist:
+            for name in lazy:
+                namespace.pop(name, None)
+        else:
+            namespace = self.eval_vars.copy()
+        namespace.update(message_vars(msg))
+        out_code = namespace["stdout"] = io.StringIO()
+        # Per-run print instead of redirect_stdout, which would swap sys.stdout for every chat.
+        namespace["print"] = functools.partial(print, file=out_code)
         try:
-            result = await myEval(code, globals(), **self.eval_vars)
-            output = out_code.getvalue() or str(result) if result is not None else "[Python] Executed"
+            result = await myEval(code, namespace, persist, **lazy)
+            output = out_code.getvalue() or (str(result) if result is not None else "[Python] Executed")
             return ExecutionResult(
                 stdout=output, stderr="", returncode=0, language=Language.PYTHON,
                 execution_time=time() - start_time, success=True
@@ -495,85 +1889,49 @@ class CodeExecutor:
                 execution_time=time() - start_time, success=False
             )
 
-    async def _run_bash(self, code: str) -> ExecutionResult:
+    async def _run_bash(self, code: str, on_output=None) -> ExecutionResult:
         start_time = time()
         try:
-            proc = await asyncio.create_subprocess_shell(
-                code, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            out, err = await asyncio.wait_for(proc.communicate(), timeout=self.config.timeout)
-            return ExecutionResult(
-                stdout=out.decode().strip(), stderr=err.decode().strip(), returncode=proc.returncode,
-                language=Language.BASH, execution_time=time() - start_time, success=proc.returncode == 0
-            )
+            return await self.runner.run(Language.BASH, code, shell=True, on_output=on_output)
+        except InfrastructureError:
+            raise
         except Exception as e:
             return ExecutionResult(
                 stdout="", stderr=f"[Bash Error] {e}", returncode=1, language=Language.BASH,
                 execution_time=time() - start_time, success=False
             )
 
-    async def _execute_local(self, code: str, lang: str) -> ExecutionResult:
+    async def _execute_local(self, code: str, lang: str, on_output=None) -> ExecutionResult:
         start_time = time()
+        file_path = None
         try:
-            if lang == Language.JAVASCRIPT:
-                file_path = self._write_temp_file(code, lang)
-                cmd = ["node", file_path]
-            else:
-                file_path = self._write_temp_file(code, lang)
-                cmd = [file_path]
-            
-            proc = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            
-            out, err = await asyncio.wait_for(proc.communicate(), timeout=self.config.timeout)
-            result = ExecutionResult(
-                stdout=out.decode().strip(), stderr=err.decode().strip(), returncode=proc.returncode,
-                language=lang, execution_time=time() - start_time, success=proc.returncode == 0
+            cmd, stdin_data, file_path = self._prepare_script(code, lang)
+            return await self.runner.run(
+                lang, cmd, stdin_data=stdin_data, on_output=on_output, address_space=lang != Language.JAVASCRIPT
             )
-            return result
-        
+        except InfrastructureError:
+            raise
         except Exception as e:
             return ExecutionResult(
                 stdout="", stderr=f"[Error] {e}", returncode=1, language=lang,
                 execution_time=time() - start_time, success=False
             )
         finally:
-            self._cleanup_temp_file(file_path)
+            if file_path:
+                self._cleanup_temp_file(file_path)
 
-    @ray.remote
-    def _execute_distributed(self, code: str, lang: str, msg: Message = None) -> ExecutionResult:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(self._execute_single(code, lang, msg))
-        finally:
-            loop.close()
+    async def execute_batch(self, snippets: List[CodeSnippet], msg: Message = None, on_output=None) -> List[ExecutionResult]:
+        tasks = [self._execute_single(s.code, s.language, msg, s.isolated, on_output, s.profile, s.session) for s in snippets]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for snippet, result in zip(snippets, results):
+            if isinstance(result, ExecutionResult):
+                self._record_history(snippet, result, msg)
 
-    async def execute_batch(self, snippets: List[CodeSnippet], msg: Message = None) -> List[ExecutionResult]:
-        results = []
-        if os.getenv("USE_RAY", "0") == "1":
-            try:
-                futures = [self._execute_distributed.remote(self, s.code, s.language, msg) for s in snippets]
-                results = ray.get(futures)
-            except Exception as e:
-                logger.error(f"Ray execution failed: {e}")
-                tasks = [self._execute_single(s.code, s.language, msg) for s in snippets]
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-        else:
-            tasks = [self._execute_single(s.code, s.language, msg) for s in snippets]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        table = Table(title="Execution Results")
-        table.add_column("Language", style="cyan")
-        table.add_column("Success", style="green")
-        table.add_column("Time", style="magenta")
-        table.add_column("Output", style="white", overflow="fold")
-        for r in results:
-            table.add_row(
-                r.language, str(r.success), humanize.naturaldelta(r.execution_time), r.stdout or r.stderr
-            )
-        console.print(table)
+        if self.config.console_table:
+            log_sink.put("table", [
+                (r.language, r.success, r.execution_time, (r.stdout or r.stderr)[:log_sink.max_field_chars])
+                for r in results if isinstance(r, ExecutionResult)
+            ])
         return results
 
     async def aexec(self, code: str, msg: Message):
@@ -585,52 +1943,116 @@ class CodeExecutor:
         )
         return await locals()["__aexec"](app, msg)
 
-    def get_history(self):
-        return self.history
+    def _record_history(self, snippet: CodeSnippet, result: ExecutionResult, msg: Message = None):
+        sender = msg and (msg.from_user or msg.sender_chat)
+        entry = HistoryEntry(
+            time(), sender.id if sender else 0, msg.chat.id if msg else 0, snippet.language,
+            hashlib.blake2b(snippet.code.encode(), digest_size=8).hexdigest(),
+            result.execution_time, result.success, result.route
+        )
+        self.history.append(entry)
+        if self.history_log:
+            record = entry.dict()
+            record.update(code=snippet.code, stdout=result.stdout, stderr=result.stderr, returncode=result.returncode)
+            asyncio.get_running_loop().run_in_executor(self.thread_pool, self.history_log.append, record)
+
+    def get_history(self, user_id: Optional[int] = None, since: Optional[float] = None, until: Optional[float] = None,
+                    page: int = 0, page_size: int = 20, full: bool = False) -> List[dict]:
+        if full and self.history_log:
+            return self.history_log.query(user_id, since, until, page * page_size, page_size)
+        entries = [
+            entry.dict() for entry in reversed(self.history)
+            if (user_id is None or entry.user_id == user_id)
+            and (since is None or entry.timestamp >= since)
+            and (until is None or entry.timestamp <= until)
+        ]
+        return entries[page * page_size:(page + 1) * page_size]
 
     def __del__(self):
-        if hasattr(self, 'process_pool'):
-            self.process_pool.close()
+        if getattr(self, 'python_pool', None):
+            self.python_pool.shutdown()
+        if getattr(self, 'node_pool', None):
+            self.node_pool.shutdown()
+        if getattr(self, 'container_pool', None):
+            self.container_pool.shutdown()
+        if getattr(self, 'history_log', None):
+            self.history_log.close()
+        if getattr(self, '_workspace', None):
+            shutil.rmtree(self._workspace, ignore_errors=True)
         if hasattr(self, 'thread_pool'):
             self.thread_pool.shutdown()
-        try:
-            ray.shutdown()
-        except Exception as e:
-            logger.error(f"Ray shutdown failed: {e}")
+        if getattr(self, 'ray_pool', None):
+            self.ray_pool.shutdown()
+            try:
+                ray.shutdown()
+            except Exception as e:
+                logger.error(f"Ray shutdown failed: {e}")
 
-executor = CodeExecutor(ExecutionConfig())
+if BOT_PROCESS:
+    executor = CodeExecutor(ExecutionConfig())
+    admission = AdmissionScheduler(
+        executor.config.max_concurrent_executions, executor.config.max_executions_per_user,
+        executor.config.max_executions_per_chat, Config.SUDOERS, executor.config.user_weights
+    )
 
 @app.on_message((filters.command("ex", Config.PREFIXS) | filters.regex(r"app.run\(\)$")))
 async def execute(app, msg: Message):
     if (msg.command and len(msg.command) == 1) or msg.text == "app.run()":
         return await eos_Send(msg, text="**No evaluate message found!**")
-    message = await msg.reply("**Processing code...**")
     code = msg.text.split(maxsplit=1)[1] if msg.command else msg.text.split("\napp.run()")[0]
+    flags, code = parse_ex_flags(code)
+    if not code.strip():
+        return await eos_Send(msg, text="**No evaluate message found!**")
+    async with observe_send("reply"):
+        message = await msg.reply("**Processing code...**")
     parts = code.split(None, 1)
     lang = None
-    if len(parts) == 2 and parts[0].lower() in ["python", "py", "js", "javascript", "bash"]:
-        lang = parts[0].lower()
-        if lang == "py":
-            lang = Language.PYTHON
-        elif lang == "js":
-            lang = Language.JAVASCRIPT
-        else:
-            lang = Language.BASH
+    if len(parts) == 2 and parts[0].lower() in LANGUAGE_ALIASES:
+        lang = LANGUAGE_ALIASES[parts[0].lower()]
         code = parts[1]
     else:
         lang = executor._auto_detect_language(code)
     
     try:
-        snippet = CodeSnippet(code=code, language=lang)
+        profile = "html" if "profile_html" in flags else "text" if "profile" in flags else None
+        session = flags.get("session")
+        session = DEFAULT_SESSION if session is True else session
+        snippet = CodeSnippet(code=code, language=lang, isolated="isolated" in flags, profile=profile, session=session)
     except pydantic.ValidationError as e:
         logger.error(f"CodeSnippet validation failed: {e}")
         await message.edit(f"**Validation Error:** {e}")
         return
     
-    results = await executor.execute_batch([snippet], msg)
+    async def on_position(position: int):
+        try:
+            async with observe_send("edit"):
+                await message.edit(f"**Processing code...** (queued, position {position})")
+        except FloodWait:
+            pass
+        except Exception as e:
+            logger.error(f"Queue position edit failed: {e}")
+
+    sender = msg.from_user or msg.sender_chat
+    async with admission.slot(sender.id if sender else msg.chat.id, msg.chat.id, on_position):
+        live = LiveOutput(message, executor.config.stream_interval) if executor.config.stream_output else None
+        try:
+            results = await executor.execute_batch([snippet], msg, on_output=live.feed if live else None)
+        finally:
+            if live:
+                await live.close()
     result = results[0]
     output = result.stdout or result.stderr
     el_str = readable_Time(result.execution_time)
+    if result.peak_memory:
+        el_str += f" (CPU {result.cpu_time:.2f}s, peak {humanize.naturalsize(result.peak_memory)})"
+    elif result.cpu_time:
+        el_str += f" (CPU {result.cpu_time:.2f}s)"
+    if result.route == "session":
+        el_str += f" [session {snippet.session}]"
+    elif result.route not in ("", "loop"):
+        el_str += f" [{result.route}]"
+    if result.retries:
+        el_str += f" (retried {result.retries}x)"
     success = f"**Input:**\n<pre>{code}</pre>\n**Output:**\n<pre>{output}</pre>\n**Executed Time:** {el_str}"
     try:
         await eos_Send(message, text=success)
@@ -638,13 +2060,24 @@ async def execute(app, msg: Message):
     except MessageTooLong:
         with io.BytesIO(str.encode(success)) as Zeep:
             Zeep.name = "ExecutionResult.txt"
-            await msg.reply_document(
-                document=Zeep,
-                caption=f"**Eval:**\n<pre language='python'>{code}</pre>\n\n**Result:**\nAttached document in file!",
-                disable_notification=True,
-                reply_to_message_id=msg.id
-            )
+            async with observe_send("document"):
+                await msg.reply_document(
+                    document=Zeep,
+                    caption=f"**Eval:**\n<pre language='python'>{code}</pre>\n\n**Result:**\nAttached document in file!",
+                    disable_notification=True,
+                    reply_to_message_id=msg.id
+                )
         await message.delete()
+    if result.profile_report:
+        with io.BytesIO(result.profile_report.encode()) as report:
+            report.name = "profile.html" if snippet.profile == "html" else "profile.txt"
+            async with observe_send("document"):
+                await msg.reply_document(
+                    document=report,
+                    caption="**Profile report**",
+                    disable_notification=True,
+                    reply_to_message_id=msg.id
+                )
 
 @app.on_message(filters.command("p2", Config.PREFIXS))
 async def runPyro_Funcs(app, msg: Message):
@@ -675,6 +2108,54 @@ async def runPyro_Funcs(app, msg: Message):
     else:
         await message.edit(oucode)
 
+@app.on_message(filters.command("session", Config.PREFIXS))
+async def session_command(app, msg: Message):
+    action = msg.command[1].lower() if len(msg.command) > 1 else "list"
+    name = msg.command[2] if len(msg.command) > 2 else DEFAULT_SESSION
+    sender = msg.from_user or msg.sender_chat
+    user_id = sender.id if sender else msg.chat.id
+    if action == "list":
+        sessions = executor.sessions.list(user_id, msg.chat.id)
+        if not sessions:
+            return await msg.reply("**No sessions.** Start one with `/ex --session[=name] code`")
+        now = monotonic()
+        lines = [
+            f"`{s.name}`: {len(s.user_vars())} names, ~{humanize.naturalsize(s.memory)}, "
+            f"{s.runs} runs, idle {readable_Time(now - s.last_used)}"
+            for s in sessions
+        ]
+        return await msg.reply("**Sessions:**\n" + "\n".join(lines))
+    if action == "reset":
+        done = executor.sessions.reset(user_id, msg.chat.id, name)
+    elif action == "drop":
+        done = executor.sessions.drop(user_id, msg.chat.id, name)
+    else:
+        return await msg.reply("**Usage:** `/session list|reset|drop [name]`")
+    await msg.reply(f"**Session `{name}` {action}{'ped' if action == 'drop' else ''}.**" if done else f"**No session `{name}`.**")
+
+@app.on_message(filters.command("stats", Config.PREFIXS))
+async def execution_stats(app, msg: Message):
+    stats = code_cache.stats()
+    results = executor.result_cache.stats()
+    queue = admission.stats()
+    sessions = executor.sessions.stats()
+    tiers = "\n".join(
+        f"  {tier}: {t['hits']} hits ({t['hit_ratio']:.1%})"
+        + (f", {humanize.naturalsize(t['bytes'])}" if "bytes" in t else "")
+        for tier, t in results["tiers"].items()
+    )
+    await msg.reply(
+        f"**Code cache:** {stats['size']}/{code_cache.maxsize} entries\n"
+        f"**Hits/Misses:** {stats['hits']}/{stats['misses']} ({stats['hit_ratio']:.1%})\n"
+        f"**Compile time:** {stats['compile_time'] * 1000:.2f}ms spent, {stats['saved_time'] * 1000:.2f}ms saved\n"
+        f"**Result cache:** {results['lookups']} lookups, {results['misses']} misses\n{tiers}\n"
+        f"**Admission:** {queue['running']} running, {queue['queued']} queued, "
+        f"{queue['waited']}/{queue['admitted']} admitted after waiting\n"
+        f"**Coalesced:** {executor.coalesced} executions saved\n"
+        f"**Sessions:** {sessions['sessions']}/{executor.sessions.max_sessions}, "
+        f"~{humanize.naturalsize(sessions['memory'])}, {sessions['evicted']} evicted"
+    )
+
 class ConfigReloadHandler(FileSystemEventHandler):
     def on_modified(self, event):
         if event.src_path.endswith("config.json"):
@@ -684,10 +2165,11 @@ class ConfigReloadHandler(FileSystemEventHandler):
 #observer = Observer()
 #observer.schedule(ConfigReloadHandler(), path=".", recursive=False)
 #observer.start()
-try:
-    app.run()
-except Exception as e:
-    logger.error(f"Bot failed to start: {e}")
+if __name__ == "__main__":
+    try:
+        app.run()
+    except Exception as e:
+        logger.error(f"Bot failed to start: {e}")
 #finally:
     #observer.stop()
     #observer.join()
@@ -0,0 +1,701 @@
+import io
+import re
+import os
+import json
+import asyncio
+import traceback
+import hashlib
+import importlib
+import codecs
+import contextlib
+import ast
+import errno
+import itertools
+import signal
+import math
+import resource
+from time import time, perf_counter, monotonic
+from inspect import CO_COROUTINE
+from typing import Optional, Tuple, List
+from collections import OrderedDict
+from pathlib import Path
+import humanize
+import msgpack
+import psutil
+import structlog
+
+logger = structlog.get_logger()
+
+class Language:
+    PYTHON = "python"
+    JAVASCRIPT = "javascript"
+    SHELL = "shell"
+    BASH = "bash"
+
+TRANSIENT_SPAWN_ERRORS = {errno.EAGAIN, errno.ENOMEM, errno.EMFILE, errno.ENFILE}
+
+class InfrastructureError(Exception):
+    def __init__(self, kind: str, message: str, started: bool = False):
+        super().__init__(message)
+        self.kind = kind
+        self.started = started
+        self.retries = 0
+
+class ExecutionResult:
+    FIELDS = (
+        "stdout", "stderr", "returncode", "language", "execution_time", "success", "truncated", "timed_out",
+        "cpu_time", "peak_memory", "profile_report", "route", "retries",
+    )
+    __slots__ = FIELDS + ("_raw",)
+
+    def __init__(self, stdout: str, stderr: str, returncode: int, language: str, execution_time: float,
+                 success: bool = False, truncated: bool = False, timed_out: bool = False, cpu_time: float = 0.0,
+                 peak_memory: int = 0, profile_report: Optional[str] = None, route: str = "", retries: int = 0):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = returncode
+        self.language = language
+        self.execution_time = execution_time
+        self.success = success
+        self.truncated = truncated
+        self.timed_out = timed_out
+        self.cpu_time = cpu_time
+        self.peak_memory = peak_memory
+        self.profile_report = profile_report
+        self.route = route
+        self.retries = retries
+        self._raw = None
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ExecutionResult":
+        result = cls.__new__(cls)
+        result._raw = data
+        return result
+
+    def __getattr__(self, name: str):
+        raw = object.__getattribute__(self, "_raw")
+        if raw is None or name not in self.FIELDS:
+            raise AttributeError(name)
+        self._raw = None
+        values = msgpack.unpackb(raw)
+        if isinstance(values, dict):
+            values = ExecutionResult(**values).dict().values()
+        elif len(values) < len(self.FIELDS):
+            values = ExecutionResult(*values).dict().values()
+        for field, value in zip(self.FIELDS, values):
+            setattr(self, field, value)
+        return getattr(self, name)
+
+    def to_bytes(self) -> bytes:
+        return msgpack.packb([getattr(self, field) for field in self.FIELDS])
+
+    def dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def copy(self) -> "ExecutionResult":
+        return ExecutionResult(**self.dict())
+
+    def __repr__(self) -> str:
+        return " ".join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS)
+
+class OutputBuffer:
+    def __init__(self, limit: int):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, chunk: bytes):
+        self.total += len(chunk)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk:
+            self.tail += chunk
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + len(self.tail)
+
+    def getvalue(self) -> str:
+        if not self.truncated:
+            return (self.head + self.tail).decode("utf-8", "replace")
+        skipped = self.total - len(self.head) - len(self.tail)
+        return (
+            f"{self.head.decode('utf-8', 'replace')}\n"
+            f"... [{humanize.naturalsize(skipped)} truncated] ...\n"
+            f"{self.tail.decode('utf-8', 'replace')}"
+        )
+
+def truncate_output(text: str, limit: int) -> Tuple[str, bool]:
+    data = text.encode("utf-8", "replace")
+    if len(data) <= limit:
+        return text, False
+    buffer = OutputBuffer(limit)
+    buffer.write(data)
+    return buffer.getvalue(), True
+
+class CodeObjectCache:
+    def __init__(self, maxsize: int = 256, on_lookup=None, on_compile=None):
+        self.maxsize = maxsize
+        self.on_lookup = on_lookup
+        self.on_compile = on_compile
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.compile_time = 0.0
+        self.saved_time = 0.0
+
+    @staticmethod
+    def make_key(code: str, persist: bool = False) -> str:
+        digest = hashlib.blake2b(code.encode(), digest_size=16)
+        if persist:
+            digest.update(b"\0persist")
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            if self.on_lookup:
+                self.on_lookup(False)
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        if self.on_lookup:
+            self.on_lookup(True)
+        self.saved_time += entry[2]
+        return entry
+
+    def put(self, key: str, comp, ret_name: str, cost: float, free_names=frozenset()):
+        self.compile_time += cost
+        if self.on_compile:
+            self.on_compile(cost)
+        self.entries[key] = (comp, ret_name, cost, free_names)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "compile_time": self.compile_time,
+            "saved_time": self.saved_time,
+        }
+
+code_cache = CodeObjectCache()
+
+class Lazy:
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __call__(self):
+        return self.func(*self.args)
+
+DYNAMIC_NAMES = frozenset(("exec", "eval", "compile", "globals", "locals", "vars", "__import__"))
+
+def _bound_names(nodes) -> set:
+    names = set()
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+            continue
+        if isinstance(node, (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            continue
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, ast.alias) and node.name != "*":
+            names.add((node.asname or node.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        stack.extend(ast.iter_child_nodes(node))
+    return names
+
+def _compile_eval(code, globs, persist=False):
+    root = ast.parse(code, "exec")
+    code_nodes = root.body
+    if not code_nodes:
+        return None, None, frozenset()
+    free_names = frozenset(
+        node.id for node in ast.walk(root) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)
+    )
+    if len(code_nodes) == 1 and isinstance(code_nodes[0], ast.Expr):
+        expr = ast.Expression(code_nodes[0].value)
+        return compile(expr, "<string>", "eval", flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT), None, free_names
+    bound = sorted(_bound_names(code_nodes)) if persist else None
+    ret_name = "_ret"
+    ok = False
+    while True:
+        if ret_name in globs.keys():
+            ret_name = f"_{ret_name}"
+            continue
+        for node in ast.walk(root):
+            if isinstance(node, ast.Name) and node.id == ret_name:
+                ret_name = f"_{ret_name}"
+                break
+            ok = True
+        if ok:
+            break
+    if not any(isinstance(node, ast.Return) for node in code_nodes):
+        for i in range(len(code_nodes)):
+            if isinstance(code_nodes[i], ast.Expr) and (
+                i == len(code_nodes) - 1 or not isinstance(code_nodes[i].value, ast.Call)
+            ):
+                code_nodes[i] = ast.copy_location(
+                    ast.Expr(
+                        ast.Call(
+                            func=ast.Attribute(
+                                value=ast.Name(id=ret_name, ctx=ast.Load()),
+                                attr="append",
+                                ctx=ast.Load(),
+                            ),
+                            args=[code_nodes[i].value],
+                            keywords=[],
+                        )
+                    ),
+                    code_nodes[-1],
+                )
+    else:
+        for node in code_nodes:
+            if isinstance(node, ast.Return):
+                node.value = ast.List(elts=[node.value], ctx=ast.Load())
+    code_nodes.append(
+        ast.copy_location(
+            ast.Return(value=ast.Name(id=ret_name, ctx=ast.Load())), code_nodes[-1]
+        )
+    )
+    ret_decl = ast.Assign(
+        targets=[ast.Name(id=ret_name, ctx=ast.Store())],
+        value=ast.List(elts=[], ctx=ast.Load()),
+    )
+    ast.fix_missing_locations(ret_decl)
+    code_nodes.insert(0, ret_decl)
+    if bound:
+        code_nodes.insert(0, ast.fix_missing_locations(ast.Global(names=bound)))
+    args = ast.arguments(
+        args=[], vararg=None, kwonlyargs=[], kwarg=None, defaults=[], kw_defaults=[]
+    )
+    args.posonlyargs = []
+    fun = ast.AsyncFunctionDef(
+        name="tmp", args=args, body=code_nodes, decorator_list=[], returns=None
+    )
+    ast.fix_missing_locations(fun)
+    mod = ast.parse("")
+    mod.body = [fun]
+    return compile(mod, "<string>", "exec"), ret_name, free_names
+
+async def myEval(code, globs, persist=False, **kwargs):
+    locs = {}
+    code = code.replace("\r\n", "\n").rstrip()
+    key = CodeObjectCache.make_key(code, persist)
+    entry = code_cache.get(key)
+    if entry is None or entry[1] in globs:
+        started = perf_counter()
+        comp, ret_name, free_names = _compile_eval(code, globs, persist)
+        code_cache.put(key, comp, ret_name, perf_counter() - started, free_names)
+    else:
+        comp, ret_name, free_names = entry[0], entry[1], entry[3]
+    if comp is None:
+        return None
+    for name in kwargs.keys() if free_names & DYNAMIC_NAMES else free_names.intersection(kwargs):
+        value = kwargs[name]
+        globs[name] = value() if isinstance(value, Lazy) else value
+    if ret_name is None:
+        r = eval(comp, globs)
+        if comp.co_flags & CO_COROUTINE:
+            r = await r
+        if hasattr(r, "__await__"):
+            r = await r
+        return r
+    exec(comp, globs, locs)
+    r = await locs["tmp"]()
+    for i in range(len(r)):
+        if hasattr(r[i], "__await__"):
+            r[i] = await r[i]
+    i = 0
+    while i < len(r) - 1:
+        if r[i] is None:
+            del r[i]
+        else:
+            i += 1
+    if len(r) == 1:
+        [r] = r
+    elif not r:
+        r = None
+    return r
+
+def format_exception(exp: BaseException, tb: Optional[List[traceback.FrameSummary]] = None) -> str:
+    if tb is None:
+        tb = traceback.extract_tb(exp.__traceback__)
+    cwd = os.getcwd()
+    for frame in tb:
+        if cwd in frame.filename:
+            frame.filename = os.path.relpath(frame.filename)
+    stack = "".join(traceback.format_list(tb))
+    msg = str(exp)
+    if msg:
+        msg = f": {msg}"
+    return f"Traceback (most recent call last):\n{stack}{type(exp).__name__}{msg}"
+
+def readable_Time(seconds: float) -> str:
+    result = ""
+    (days, remainder) = divmod(seconds, 86400)
+    days = int(days)
+    if days != 0:
+        result += f"{days}d:"
+    (hours, remainder) = divmod(remainder, 3600)
+    hours = int(hours)
+    if hours != 0:
+        result += f"{hours}h:"
+    (minutes, seconds) = divmod(remainder, 60)
+    minutes = int(minutes)
+    if minutes != 0:
+        result += f"{minutes}m:"
+    seconds = int(seconds)
+    result += f"{seconds}s"
+    return result or "0.1s"
+
+WORKER_PRELOAD = ("re", "json", "aiohttp", "bs4", "requests")
+
+async def _eval_isolated(code: str, globs: dict, max_output_bytes: int) -> ExecutionResult:
+    start_time = time()
+    out_code = io.StringIO()
+    worker_vars = {
+        "re": re,
+        "json": json,
+        "aiohttp": importlib.import_module("aiohttp"),
+        "requests": importlib.import_module("requests"),
+        "soup": importlib.import_module("bs4").BeautifulSoup,
+        "asyncio": asyncio,
+        "traceback": traceback,
+        "os": os,
+        "humantime": readable_Time,
+        "stdout": out_code,
+    }
+    try:
+        with contextlib.redirect_stdout(out_code):
+            result = await myEval(code, dict(globs), **worker_vars)
+        output = out_code.getvalue() or (str(result) if result is not None else "[Python] Executed")
+        output, truncated = truncate_output(output, max_output_bytes)
+        return ExecutionResult(
+            stdout=output, stderr="", returncode=0, language=Language.PYTHON,
+            execution_time=time() - start_time, success=True, truncated=truncated
+        )
+    except Exception as e:
+        output, truncated = truncate_output(out_code.getvalue(), max_output_bytes)
+        return ExecutionResult(
+            stdout=output, stderr=format_exception(e), returncode=1, language=Language.PYTHON,
+            execution_time=time() - start_time, success=False, truncated=truncated
+        )
+
+def count_user_tasks() -> int:
+    uid = os.getuid()
+    return sum(
+        p.info["num_threads"] or 0
+        for p in psutil.process_iter(["uids", "num_threads"])
+        if p.info["uids"] and p.info["uids"].real == uid
+    )
+
+def _cpu_exceeded(signum, frame):
+    raise TimeoutError("CPU time limit exceeded")
+
+def _limit_worker(limits: dict):
+    vms = psutil.Process().memory_info().vms
+    for limit, value in (
+        (resource.RLIMIT_AS, vms + limits["memory_bytes"]),
+        (resource.RLIMIT_NOFILE, limits["max_open_files"]),
+        (resource.RLIMIT_NPROC, count_user_tasks() + limits["max_processes"]),
+    ):
+        soft, hard = resource.getrlimit(limit)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        with contextlib.suppress(ValueError, OSError):
+            resource.setrlimit(limit, (value, value))
+    signal.signal(signal.SIGXCPU, _cpu_exceeded)
+
+def _arm_cpu_limit(seconds: int):
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    value = math.ceil(usage.ru_utime + usage.ru_stime) + seconds
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    with contextlib.suppress(ValueError, OSError):
+        resource.setrlimit(resource.RLIMIT_CPU, (value, hard))
+
+def _python_worker_main(conn, preload, max_output_bytes, limits: Optional[dict] = None):
+    for name in preload:
+        importlib.import_module(name)
+    if limits:
+        _limit_worker(limits)
+    globs = {"__name__": "__worker__", "__package__": None}
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    while True:
+        try:
+            code = conn.recv()
+        except (EOFError, OSError):
+            break
+        if code is None:
+            break
+        if limits:
+            _arm_cpu_limit(limits["cpu_seconds"])
+        execution = loop.run_until_complete(_eval_isolated(code, globs, max_output_bytes))
+        try:
+            conn.send(execution.dict())
+        except (EOFError, OSError):
+            break
+    loop.close()
+
+class ProcessSandbox:
+    GATE = ("/bin/sh", "-c", 'read -r _ || exit 125; exec "$@"', "sandbox")
+
+    def __init__(self, memory_bytes: int, cpu_seconds: int, max_processes: int, max_open_files: int,
+                 cgroup_root: Optional[str] = None):
+        self.memory_bytes = memory_bytes
+        self.cpu_seconds = cpu_seconds
+        self.max_processes = max_processes
+        self.max_open_files = max_open_files
+        self.cgroup_root = self._detect_cgroup(cgroup_root)
+        self.run_ids = itertools.count(1)
+        self.user_tasks = (0, float("-inf"))
+
+    def _detect_cgroup(self, root: Optional[str]) -> Optional[Path]:
+        if not root:
+            return None
+        path = Path(root)
+        try:
+            controllers = (path / "cgroup.subtree_control").read_text().split()
+        except OSError as e:
+            logger.error(f"cgroup v2 root {path} unavailable: {e}")
+            return None
+        if not {"memory", "pids"} <= set(controllers) or not os.access(path, os.W_OK):
+            logger.error(f"cgroup v2 root {path} lacks writable memory/pids controllers")
+            return None
+        return path
+
+    def create_run(self) -> Optional[Path]:
+        if self.cgroup_root is None:
+            return None
+        path = self.cgroup_root / f"run-{os.getpid()}-{next(self.run_ids)}"
+        try:
+            path.mkdir()
+            (path / "memory.max").write_text(str(self.memory_bytes))
+            (path / "pids.max").write_text(str(self.max_processes))
+            with contextlib.suppress(OSError):
+                (path / "memory.swap.max").write_text("0")
+        except OSError as e:
+            logger.error(f"Failed to create cgroup {path}: {e}")
+            with contextlib.suppress(OSError):
+                path.rmdir()
+            return None
+        return path
+
+    async def _nproc_limit(self) -> int:
+        count, checked = self.user_tasks
+        if monotonic() - checked > 10:
+            count = await asyncio.to_thread(count_user_tasks)
+            self.user_tasks = (count, monotonic())
+        return count + self.max_processes
+
+    async def limits(self, cgroup: Optional[Path], address_space: bool = True) -> list:
+        limits = [(resource.RLIMIT_CPU, self.cpu_seconds), (resource.RLIMIT_NOFILE, self.max_open_files)]
+        if cgroup is None:
+            limits.append((resource.RLIMIT_NPROC, await self._nproc_limit()))
+            if address_space:
+                limits.append((resource.RLIMIT_AS, self.memory_bytes))
+        return limits
+
+    def confine(self, pid: int, limits: list, cgroup: Optional[Path]):
+        for limit, value in limits:
+            soft, hard = resource.prlimit(pid, limit)
+            if hard != resource.RLIM_INFINITY:
+                value = min(value, hard)
+            resource.prlimit(pid, limit, (value, value))
+        if cgroup is not None:
+            (cgroup / "cgroup.procs").write_text(str(pid))
+
+    async def release(self, cgroup: Optional[Path]) -> Tuple[float, int]:
+        # Without a cgroup there is no per-run accounting: RUSAGE_CHILDREN also
+        # counts every other child reaped meanwhile, so report nothing.
+        if cgroup is None:
+            return 0.0, 0
+        cpu_time, peak_memory = 0.0, 0
+        with contextlib.suppress(OSError, ValueError):
+            for line in (cgroup / "cpu.stat").read_text().splitlines():
+                if line.startswith("usage_usec"):
+                    cpu_time = int(line.split()[1]) / 1e6
+        with contextlib.suppress(OSError, ValueError):
+            peak_memory = int((cgroup / "memory.peak").read_text())
+        with contextlib.suppress(OSError):
+            (cgroup / "cgroup.kill").write_text("1")
+        for _ in range(20):
+            try:
+                cgroup.rmdir()
+                break
+            except OSError:
+                await asyncio.sleep(0.01)
+        else:
+            logger.error(f"Failed to remove cgroup {cgroup}")
+        return cpu_time, peak_memory
+
+class SubprocessRunner:
+    def __init__(self, sandbox: Optional[ProcessSandbox], timeout: float, max_output_bytes: int,
+                 on_spawn=None, on_timeout=None):
+        self.sandbox = sandbox
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self.on_spawn = on_spawn
+        self.on_timeout = on_timeout
+
+    async def _pump(self, reader: asyncio.StreamReader, sink: OutputBuffer, on_output=None):
+        decoder = codecs.getincrementaldecoder("utf-8")("replace") if on_output else None
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            sink.write(chunk)
+            if decoder:
+                text = decoder.decode(chunk)
+                if text:
+                    on_output(text)
+
+    async def _feed_stdin(self, proc, stdin_data: Optional[bytes]):
+        if stdin_data is None or proc.stdin is None:
+            return
+        try:
+            proc.stdin.write(stdin_data)
+            await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            proc.stdin.close()
+
+    async def _drain(self, proc, out: OutputBuffer, err: OutputBuffer, stdin_data: Optional[bytes], on_output):
+        await asyncio.gather(
+            self._feed_stdin(proc, stdin_data),
+            self._pump(proc.stdout, out, on_output),
+            self._pump(proc.stderr, err, on_output),
+        )
+        await proc.wait()
+
+    async def _communicate(self, proc, stdin_data: Optional[bytes] = None, on_output=None):
+        out = OutputBuffer(self.max_output_bytes)
+        err = OutputBuffer(self.max_output_bytes)
+        timed_out = False
+        try:
+            await asyncio.wait_for(self._drain(proc, out, err, stdin_data, on_output), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            if self.on_timeout:
+                self.on_timeout()
+        finally:
+            self._kill_process_group(proc)
+            if proc.returncode is None:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(proc.wait(), timeout=1)
+        return out, err, timed_out
+
+    def _kill_process_group(self, proc):
+        try:
+            if os.name != "nt":
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def run(
+        self, lang: str, cmd, shell: bool = False, stdin_data: Optional[bytes] = None, on_output=None,
+        address_space: bool = True
+    ) -> ExecutionResult:
+        start_time = time()
+        cgroup = limits = None
+        if self.sandbox is not None:
+            cgroup = self.sandbox.create_run()
+            limits = await self.sandbox.limits(cgroup, address_space)
+            cmd = [*self.sandbox.GATE, *(["/bin/sh", "-c", cmd] if shell else cmd)]
+            shell = False
+            stdin_data = b"\n" + (stdin_data or b"")
+        kwargs = {
+            "stdin": asyncio.subprocess.PIPE if stdin_data is not None else None,
+            "stdout": asyncio.subprocess.PIPE,
+            "stderr": asyncio.subprocess.PIPE,
+            "start_new_session": os.name != "nt",
+        }
+        try:
+            started = perf_counter()
+            try:
+                if shell:
+                    proc = await asyncio.create_subprocess_shell(cmd, **kwargs)
+                else:
+                    proc = await asyncio.create_subprocess_exec(*cmd, **kwargs)
+            except OSError as e:
+                if e.errno in TRANSIENT_SPAWN_ERRORS:
+                    raise InfrastructureError("spawn", f"Failed to start {lang}: {e}") from e
+                raise
+            if limits is not None:
+                try:
+                    self.sandbox.confine(proc.pid, limits, cgroup)
+                except (OSError, ValueError):
+                    self._kill_process_group(proc)
+                    await proc.wait()
+                    raise
+            if self.on_spawn:
+                self.on_spawn(perf_counter() - started)
+            out, err, timed_out = await self._communicate(proc, stdin_data, on_output)
+        finally:
+            cpu_time, peak_memory = await self.sandbox.release(cgroup) if self.sandbox else (0.0, 0)
+        stderr = err.getvalue().strip()
+        if timed_out:
+            stderr = f"{stderr}\n[Timeout] Killed after {self.timeout}s".strip()
+        return ExecutionResult(
+            stdout=out.getvalue().strip(), stderr=stderr,
+            returncode=proc.returncode if proc.returncode is not None else -signal.SIGKILL,
+            language=lang, execution_time=time() - start_time, success=not timed_out and proc.returncode == 0,
+            truncated=out.truncated or err.truncated, timed_out=timed_out,
+            cpu_time=cpu_time, peak_memory=peak_memory
+        )
+
+class RaySnippetActor:
+    def __init__(self, timeout: float, max_output_bytes: int, limits: dict, preload=WORKER_PRELOAD):
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        for name in preload:
+            importlib.import_module(name)
+        self.globs = {"__name__": "__worker__", "__package__": None}
+        self.memory_mb = limits["memory_bytes"] >> 20
+        sandbox = ProcessSandbox(**limits) if hasattr(resource, "prlimit") else None
+        self.runner = SubprocessRunner(sandbox, timeout, max_output_bytes)
+
+    def ready(self) -> int:
+        return os.getpid()
+
+    async def run(self, code: str, lang: str) -> dict:
+        if lang == Language.PYTHON:
+            try:
+                result = await asyncio.wait_for(_eval_isolated(code, self.globs, self.max_output_bytes), self.timeout)
+            except asyncio.TimeoutError:
+                result = ExecutionResult(
+                    stdout="", stderr=f"[Ray Actor] Timed out after {self.timeout}s", returncode=-9,
+                    language=lang, execution_time=self.timeout, success=False, timed_out=True
+                )
+            return result.dict()
+        if lang == Language.JAVASCRIPT:
+            cmd = ["node", f"--max-old-space-size={self.memory_mb}", "-"]
+        else:
+            cmd = ["bash", "-s"]
+        result = await self.runner.run(lang, cmd, stdin_data=code.encode(), address_space=lang != Language.JAVASCRIPT)
+        return result.dict()
@@ -0,0 +1,221 @@
+const vm = require("vm");
+const util = require("util");
+
+const writeFrame = process.stdout.write.bind(process.stdout);
+let active = null;
+
+function capture(stream) {
+  return (chunk, ...args) => {
+    if (active) active[stream].push(String(chunk));
+    const callback = args.find((arg) => typeof arg === "function");
+    if (callback) callback();
+    return true;
+  };
+}
+
+process.stdout.write = capture("stdout");
+process.stderr.write = capture("stderr");
+
+function send(payload) {
+  const body = Buffer.from(JSON.stringify(payload), "utf8");
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(body.length, 0);
+  writeFrame(Buffer.concat([header, body]));
+}
+
+function createBuffer(limit) {
+  const headLimit = Math.floor(limit / 2);
+  const tailLimit = limit - headLimit;
+  const head = [];
+  const tail = [];
+  let headBytes = 0;
+  let tailBytes = 0;
+  let total = 0;
+  return {
+    push(text) {
+      let chunk = Buffer.from(String(text), "utf8");
+      total += chunk.length;
+      if (headBytes < headLimit) {
+        const take = Buffer.from(chunk.subarray(0, headLimit - headBytes));
+        head.push(take);
+        headBytes += take.length;
+        chunk = chunk.subarray(take.length);
+      }
+      if (!chunk.length) return;
+      tail.push(chunk);
+      tailBytes += chunk.length;
+      while (tailBytes > tailLimit) {
+        const excess = tailBytes - tailLimit;
+        if (tail[0].length <= excess) {
+          tailBytes -= tail.shift().length;
+        } else {
+          tail[0] = Buffer.from(tail[0].subarray(excess));
+          tailBytes -= excess;
+        }
+      }
+    },
+    get truncated() {
+      return total > headBytes + tailBytes;
+    },
+    value() {
+      const headText = Buffer.concat(head).toString("utf8");
+      const tailText = Buffer.concat(tail).toString("utf8");
+      if (!this.truncated) return headText + tailText;
+      return `${headText}\n... [${total - headBytes - tailBytes} bytes truncated] ...\n${tailText}`;
+    },
+  };
+}
+
+function createConsole(run) {
+  const line = (stream) => (...args) => run[stream].push(util.format(...args) + "\n");
+  return {
+    log: line("stdout"),
+    info: line("stdout"),
+    debug: line("stdout"),
+    dir: (obj) => run.stdout.push(util.inspect(obj) + "\n"),
+    table: line("stdout"),
+    warn: line("stderr"),
+    error: line("stderr"),
+    trace: line("stderr"),
+  };
+}
+
+function createTimers(run) {
+  const settle = () => {
+    if (run.pending.size === 0 && run.scriptDone) run.finish();
+  };
+  const track = (create, clear, repeat) => (fn, ms, ...args) => {
+    let handle;
+    handle = create(() => {
+      if (!repeat) run.pending.delete(handle);
+      try {
+        fn(...args);
+      } catch (err) {
+        run.fail(err);
+      }
+      settle();
+    }, ms);
+    run.pending.add(handle);
+    run.clears.set(handle, clear);
+    return handle;
+  };
+  const untrack = (clear) => (handle) => {
+    clear(handle);
+    run.pending.delete(handle);
+    settle();
+  };
+  return {
+    setTimeout: track(setTimeout, clearTimeout, false),
+    setInterval: track(setInterval, clearInterval, true),
+    setImmediate: (fn, ...args) => track(setTimeout, clearTimeout, false)(fn, 0, ...args),
+    clearTimeout: untrack(clearTimeout),
+    clearInterval: untrack(clearInterval),
+    clearImmediate: untrack(clearTimeout),
+  };
+}
+
+function execute({ id, code, timeout, max_output: maxOutput = 64 * 1024 }) {
+  const run = {
+    stdout: createBuffer(maxOutput),
+    stderr: createBuffer(maxOutput),
+    pending: new Set(),
+    clears: new Map(),
+    scriptDone: false,
+    failed: false,
+    finished: false,
+  };
+  active = run;
+  const started = process.hrtime.bigint();
+  let timer = null;
+
+  const reply = (returncode, timedOut) => {
+    if (run.finished) return;
+    run.finished = true;
+    clearTimeout(timer);
+    for (const handle of run.pending) run.clears.get(handle)(handle);
+    run.pending.clear();
+    if (active === run) active = null;
+    send({
+      id,
+      stdout: run.stdout.value(),
+      stderr: run.stderr.value(),
+      returncode,
+      timed_out: timedOut,
+      truncated: run.stdout.truncated || run.stderr.truncated,
+      elapsed_ms: Number(process.hrtime.bigint() - started) / 1e6,
+    });
+  };
+  run.finish = () => reply(run.failed ? 1 : 0, false);
+  run.fail = (err) => {
+    run.failed = true;
+    run.stderr.push((err && err.stack) || String(err));
+    reply(1, false);
+  };
+
+  timer = setTimeout(() => {
+    run.stderr.push(`Execution timed out after ${timeout}ms`);
+    reply(124, true);
+  }, timeout);
+
+  const sandbox = {
+    console: createConsole(run),
+    require,
+    process,
+    Buffer,
+    URL,
+    URLSearchParams,
+    TextEncoder,
+    TextDecoder,
+    fetch,
+    ...createTimers(run),
+  };
+  sandbox.globalThis = sandbox;
+
+  try {
+    const script = new vm.Script(code.includes("await") ? `(async () => { ${code} })()` : code, {
+      filename: "snippet.js",
+    });
+    const result = script.runInContext(vm.createContext(sandbox), { timeout });
+    Promise.resolve(result).then(
+      // Finish a turn later so rejections the snippet left unhandled still land on it.
+      () =>
+        setImmediate(() => {
+          run.scriptDone = true;
+          if (run.pending.size === 0) run.finish();
+        }),
+      (err) => run.fail(err)
+    );
+  } catch (err) {
+    if (err && err.code === "ERR_SCRIPT_EXECUTION_TIMEOUT") {
+      run.stderr.push(`Execution timed out after ${timeout}ms`);
+      reply(124, true);
+    } else {
+      run.fail(err);
+    }
+  }
+}
+
+let buffer = Buffer.alloc(0);
+
+process.stdin.on("data", (chunk) => {
+  buffer = Buffer.concat([buffer, chunk]);
+  while (buffer.length >= 4) {
+    const length = buffer.readUInt32BE(0);
+    if (buffer.length < 4 + length) break;
+    const request = JSON.parse(buffer.subarray(4, 4 + length).toString("utf8"));
+    buffer = buffer.subarray(4 + length);
+    execute(request);
+  }
+});
+
+process.stdin.on("end", () => process.exit(0));
+
+process.on("uncaughtException", (err) => {
+  if (active) active.fail(err);
+});
+
+process.on("unhandledRejection", (err) => {
+  if (active) active.fail(err);
+});
+
+send({ ready: true });
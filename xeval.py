@@ -10,15 +10,17 @@ import aiohttp
 import asyncio
 import requests
 import traceback
+import hashlib
 import contextlib
 import cloudscraper
-from time import time
+from time import time, perf_counter
 from os import environ as env
 from pyrogram import Client, filters
 from bs4 import BeautifulSoup
 from inspect import getfullargspec
 from pyrogram.enums import ParseMode
 from typing import Optional, Tuple, Any, List
+from collections import OrderedDict
 from pyrogram.errors import MessageTooLong
 from pyrogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup
 import ast
@@ -100,15 +102,53 @@ Fetch = httpx.AsyncClient(
     timeout=httpx.Timeout(20)
 )
 
-async def myEval(code, globs, **kwargs):
-    locs = {}
-    globs = globs.copy()
-    global_args = "_globs"
-    while global_args in globs.keys():
-        global_args = f"_{global_args}"
-    kwargs[global_args] = {}
-    for glob in ["__name__", "__package__"]:
-        kwargs[global_args][glob] = globs[glob]
+class CodeObjectCache:
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.compile_time = 0.0
+        self.saved_time = 0.0
+
+    @staticmethod
+    def make_key(code: str, global_args: str, arg_names) -> str:
+        digest = hashlib.blake2b(code.encode(), digest_size=16)
+        digest.update(b"\0" + global_args.encode())
+        digest.update(b"\0" + ",".join(sorted(arg_names)).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        self.saved_time += entry[2]
+        return entry
+
+    def put(self, key: str, comp, ret_name: str, cost: float):
+        self.compile_time += cost
+        self.entries[key] = (comp, ret_name, cost)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "compile_time": self.compile_time,
+            "saved_time": self.saved_time,
+        }
+
+code_cache = CodeObjectCache()
+
+def _compile_eval(code, globs, arg_names, global_args):
     root = ast.parse(code, "exec")
     code_nodes = root.body
     ret_name = "_ret"
@@ -125,7 +165,7 @@ async def myEval(code, globs, **kwargs):
         if ok:
             break
     if not code_nodes:
-        return None
+        return None, ret_name
     if not any(isinstance(node, ast.Return) for node in code_nodes):
         for i in range(len(code_nodes)):
             if isinstance(code_nodes[i], ast.Expr) and (
@@ -178,7 +218,7 @@ async def myEval(code, globs, **kwargs):
     ast.fix_missing_locations(ret_decl)
     code_nodes.insert(1, ret_decl)
     args = []
-    for a in list(map(lambda x: ast.arg(x, None), kwargs.keys())):
+    for a in list(map(lambda x: ast.arg(x, None), arg_names)):
         ast.fix_missing_locations(a)
         args += [a]
     args = ast.arguments(
@@ -196,7 +236,28 @@ async def myEval(code, globs, **kwargs):
     ast.fix_missing_locations(fun)
     mod = ast.parse("")
     mod.body = [fun]
-    comp = compile(mod, "<string>", "exec")
+    return compile(mod, "<string>", "exec"), ret_name
+
+async def myEval(code, globs, **kwargs):
+    locs = {}
+    globs = globs.copy()
+    global_args = "_globs"
+    while global_args in globs.keys():
+        global_args = f"_{global_args}"
+    kwargs[global_args] = {}
+    for glob in ["__name__", "__package__"]:
+        kwargs[global_args][glob] = globs[glob]
+    code = code.replace("\r\n", "\n").rstrip()
+    key = CodeObjectCache.make_key(code, global_args, kwargs.keys())
+    entry = code_cache.get(key)
+    if entry is None or entry[1] in globs:
+        started = perf_counter()
+        comp, ret_name = _compile_eval(code, globs, list(kwargs.keys()), global_args)
+        code_cache.put(key, comp, ret_name, perf_counter() - started)
+    else:
+        comp = entry[0]
+    if comp is None:
+        return None
     exec(comp, {}, locs)
     r = await locs["tmp"](**kwargs)
     for i in range(len(r)):
@@ -274,7 +335,7 @@ class ExecutionConfig(pydantic.BaseModel):
     use_docker: bool = False
     max_memory_mb: int = 512
     retry_attempts: int = 3
-    cache_results: bool = True
+    cache_results: bool = False
 
 class CodeExecutor:
     def __init__(self, config: ExecutionConfig):
@@ -614,6 +675,15 @@ async def runPyro_Funcs(app, msg: Message):
     else:
         await message.edit(oucode)
 
+@app.on_message(filters.command("stats", Config.PREFIXS))
+async def execution_stats(app, msg: Message):
+    stats = code_cache.stats()
+    await msg.reply(
+        f"**Code cache:** {stats['size']}/{code_cache.maxsize} entries\n"
+        f"**Hits/Misses:** {stats['hits']}/{stats['misses']} ({stats['hit_ratio']:.1%})\n"
+        f"**Compile time:** {stats['compile_time'] * 1000:.2f}ms spent, {stats['saved_time'] * 1000:.2f}ms saved"
+    )
+
 class ConfigReloadHandler(FileSystemEventHandler):
     def on_modified(self, event):
         if event.src_path.endswith("config.json"):